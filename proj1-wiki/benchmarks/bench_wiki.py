@@ -0,0 +1,187 @@
+"""
+Benchmarks for the encyclopedia app.
+
+Generates a synthetic corpus of entries in a temporary folder, then
+times util.list_entries, get_entry, save_entry, views.convert_md_to_html
+and the entry, search and random views through the Django test client.
+Results are written as JSON so that runs from different commits can be
+compared.
+
+    python benchmarks/bench_wiki.py --entries 10000 --words 400 --output bench.json
+
+The corpus is generated from --seed, so runs with the same arguments
+time the same pages.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wiki.settings")
+
+VOCABULARY = """
+algorithm browser cache client compile database django element function
+framework html http index javascript language layout markup network object
+python query request response render route server session style template
+thread unicode variable web widget
+""".split()
+
+
+def make_corpus(folder, entries, words, seed):
+    """
+    Writes entries Markdown files of about words words each into folder
+    and returns their titles.
+    """
+    rng = random.Random(seed)
+    titles = [f"{rng.choice(VOCABULARY).title()}{i:07d}" for i in range(entries)]
+    os.makedirs(folder, exist_ok=True)
+    for title in titles:
+        lines = [f"# {title}", ""]
+        written = 0
+        while written < words:
+            sentence = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+            # roughly one link to another entry per paragraph
+            link = rng.choice(titles)
+            sentence.append(f"[{link}](/wiki/{link})")
+            lines.extend([" ".join(sentence) + ".", ""])
+            if rng.random() < 0.2:
+                lines.extend([f"## {rng.choice(VOCABULARY).title()}", ""])
+            written += len(sentence)
+        with open(os.path.join(folder, f"{title}.md"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return titles
+
+
+def measure(fn, repeat):
+    """
+    Calls fn(i) repeat times and returns latency percentiles in
+    milliseconds and calls per second.
+    """
+    timings = []
+    started = time.perf_counter()
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    total = time.perf_counter() - started
+    timings.sort()
+    return {
+        "calls": repeat,
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "max_ms": timings[-1],
+        "per_second": repeat / total if total else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_DIR, capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    import django
+    from django.conf import settings
+
+    media_root = tempfile.mkdtemp(prefix="wiki-bench-")
+    # default_storage keeps entries under MEDIA_ROOT/entries
+    settings.MEDIA_ROOT = media_root
+    settings.ALLOWED_HOSTS = ["testserver"]
+    # no background rendering after saves: it would compete with, and warm
+    # the render cache ahead of, the requests being timed
+    settings.WIKI_PRERENDER_WORKERS = 0
+    django.setup()
+
+    from django.test import Client
+    from django.urls import reverse
+    from encyclopedia import util, views
+
+    try:
+        started = time.perf_counter()
+        titles = make_corpus(os.path.join(media_root, "entries"), args.entries, args.words, args.seed)
+        corpus_seconds = time.perf_counter() - started
+
+        rng = random.Random(args.seed + 1)
+        sample = [rng.choice(titles) for _ in range(args.repeat)]
+        queries = [rng.choice(VOCABULARY) for _ in range(args.repeat)]
+        client = Client()
+        results = {}
+
+        def list_cold(i):
+            util.reload_entries()
+            util.list_entries()
+
+        results["list_entries_cold"] = measure(list_cold, min(args.repeat, 20))
+        results["list_entries"] = measure(lambda i: util.list_entries(), args.repeat)
+        results["get_entry"] = measure(lambda i: util.get_entry(sample[i]), args.repeat)
+
+        def convert_cold(i):
+            views.render_cache.reset()
+            views.block_renderer.cache.reset()
+            views.convert_md_to_html(sample[i])
+
+        results["convert_md_to_html_cold"] = measure(convert_cold, args.repeat)
+        for title in set(sample):
+            views.convert_md_to_html(title)
+        results["convert_md_to_html_cached"] = measure(lambda i: views.convert_md_to_html(sample[i]), args.repeat)
+        results["save_entry"] = measure(
+            lambda i: util.save_entry(sample[i], util.get_entry(sample[i]) + "\nedited.\n"), args.repeat)
+
+        # the first search and entry page build the in-memory indexes;
+        # time that once, apart from the steady state
+        results["first_search"] = measure(lambda i: client.post(reverse("search"), {"q": queries[0]}), 1)
+        results["first_entry_view"] = measure(lambda i: client.get(reverse("entry", args=[sample[0]])), 1)
+        results["view_entry"] = measure(
+            lambda i: client.get(reverse("entry", args=[sample[i]])), args.repeat)
+        results["view_search"] = measure(
+            lambda i: client.post(reverse("search"), {"q": queries[i]}), args.repeat)
+        results["view_random"] = measure(lambda i: client.get(reverse("random")), args.repeat)
+        results["view_index"] = measure(lambda i: client.get(reverse("index")), min(args.repeat, 50))
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "storage": getattr(settings, "WIKI_ENTRY_STORAGE", "default"),
+        "corpus": {"entries": args.entries, "words": args.words, "seed": args.seed,
+                   "generate_seconds": corpus_seconds},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000, help="number of entries in the corpus")
+    parser.add_argument("--words", type=int, default=300, help="approximate words per entry")
+    parser.add_argument("--repeat", type=int, default=200, help="calls timed per benchmark")
+    parser.add_argument("--seed", type=int, default=50, help="seed for the corpus and the sampled titles")
+    parser.add_argument("--output", help="file to write the json results to, instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
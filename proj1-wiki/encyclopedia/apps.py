@@ -1,5 +1,31 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class EncyclopediaConfig(AppConfig):
+    default_auto_field = 'django.db.models.AutoField'
     name = 'encyclopedia'
+
+    def ready(self):
+        # pick up entries copied into the entries folder by git, rsync etc.
+        # started on the first request, so only processes that serve pages
+        # watch the folder: not manage.py commands, their worker processes
+        # or the process runserver uses to reload the others
+        if getattr(settings, "WIKI_WATCH_ENTRIES", False):
+            request_started.connect(_start_watcher, dispatch_uid="encyclopedia.start_watcher")
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def _start_watcher(**kwargs):
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            from .watcher import start_watcher
+            _watcher = start_watcher()
+    request_started.disconnect(dispatch_uid="encyclopedia.start_watcher")
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import util
+from .link_graph import link_graph
+from .views import (PAGE_SIZE, convert_md_to_html, entry_etag, entry_last_modified,
+                    index_items, search_page, stream_index_parts)
+
+# async versions of the index, entry and search views for running under
+# wiki/asgi.py, used when WIKI_ASYNC_VIEWS is True. Reading entries and
+# building indexes happen on one thread pool and markdown conversion on
+# another, so a slow client only holds on to the event loop while waiting.
+
+_io_pool = ThreadPoolExecutor(max_workers=getattr(settings, "WIKI_ASYNC_IO_WORKERS", 32),
+                              thread_name_prefix="wiki-io")
+_render_pool = ThreadPoolExecutor(max_workers=getattr(settings, "WIKI_ASYNC_RENDER_WORKERS", os.cpu_count()),
+                                  thread_name_prefix="wiki-render")
+
+
+async def _io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_io_pool, fn, *args)
+
+
+async def _rendered(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_render_pool, fn, *args)
+
+
+async def index(request):
+    if request.GET.get('all'):
+        return StreamingHttpResponse(_stream_index(request))
+
+    entries, next_after = await _io(util.list_entries_page, request.GET.get('after'), PAGE_SIZE)
+    return render(request, "encyclopedia/index.html", {
+        "entries": entries,
+        "next_after": next_after
+    })
+
+
+async def _stream_index(request):
+    head, tail = stream_index_parts(request)
+    yield head
+    entries, next_after = await _io(util.list_entries_page, None, PAGE_SIZE)
+    while entries:
+        yield index_items(entries)
+        if next_after is None:
+            break
+        entries, next_after = await _io(util.list_entries_page, next_after, PAGE_SIZE)
+    yield tail
+
+
+def _validators(title):
+    # same ETag and Last-Modified as the sync entry view
+    return entry_etag(None, title), entry_last_modified(None, title)
+
+
+async def entry(request, title):
+    etag, last_modified = await _io(_validators, title)
+    if etag is not None:
+        etag = quote_etag(etag)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if not_modified is not None:
+            return not_modified
+
+    markdown = await _io(util.get_entry, title)
+    if markdown is None:
+        return render(request, "encyclopedia/error.html",
+            {"message": "page does not exist"})
+
+    content = await _rendered(convert_md_to_html, title, markdown)
+    backlinks = await _io(link_graph.backlinks, title)
+    broken_links = await _io(link_graph.broken_links, title)
+    response = render(request, "encyclopedia/entry.html",
+        {"title": title, "content": content,
+         "backlinks": backlinks, "broken_links": broken_links})
+    if etag is not None:
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+async def search(request):
+    query = request.POST.get('q') if request.method == "POST" else request.GET.get('q')
+    if query is None:
+        return redirect(reverse('index'))
+
+    if await _io(util.entry_exists, query):
+        return redirect(reverse('entry', args=[query]))
+
+    search_result, next_after, suggestions = await _io(
+        search_page, query, request.GET.get('after'), PAGE_SIZE)
+    return render(request, "encyclopedia/results.html",
+        {"search_result": search_result, "suggestions": suggestions,
+         "query": query, "next_after": next_after})
@@ -0,0 +1,59 @@
+import threading
+from bisect import bisect_left, insort
+
+from . import util
+
+
+class TitleCompleter:
+    """
+    Sorted array of (lowercased title, title) pairs. Completions for a
+    prefix are the run of pairs starting at its bisect position.
+    """
+
+    def __init__(self):
+        self._pairs = None
+        self._lock = threading.Lock()
+
+    def _ensure_built(self):
+        if self._pairs is None:
+            with self._lock:
+                if self._pairs is None:
+                    self._pairs = sorted((title.lower(), title) for title in util.list_entries())
+
+    # called by util.save_entry / util.reload_entries
+    def update(self, title, content):
+        with self._lock:
+            if self._pairs is None:
+                return
+            pair = (title.lower(), title)
+            i = bisect_left(self._pairs, pair)
+            present = i < len(self._pairs) and self._pairs[i] == pair
+            if content is None and present:
+                del self._pairs[i]
+            elif content is not None and not present:
+                insort(self._pairs, pair)
+
+    def reset(self):
+        with self._lock:
+            self._pairs = None
+
+    def complete(self, prefix, limit=10):
+        """
+        Returns up to limit titles starting with prefix, ignoring case,
+        in alphabetical order.
+        """
+        self._ensure_built()
+        prefix = prefix.lower()
+        results = []
+        with self._lock:
+            i = bisect_left(self._pairs, (prefix,))
+            while i < len(self._pairs) and len(results) < limit:
+                lowered, title = self._pairs[i]
+                if not lowered.startswith(prefix):
+                    break
+                results.append(title)
+                i += 1
+        return results
+
+
+title_completer = util.register_index(TitleCompleter())
@@ -0,0 +1,86 @@
+import re
+
+from .render_cache import RenderCache, content_hash
+
+
+_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_LIST_ITEM = re.compile(r"^\s{0,3}([-*+]|\d+[.)])\s")
+# reference link definitions and footnotes are resolved across the whole
+# document, and a raw html block runs to its closing tag across blank
+# lines, so pages using any of them are always rendered in one piece
+# (a line starting with an autolink like <https://...> is not html)
+_DOCUMENT_WIDE = re.compile(
+    r"^\s{0,3}\[[^\]]+\]:|\[\^[^\]]+\]|^\s{0,3}<(?:[A-Za-z][\w-]*(?:[\s/>]|$)|!--|/[A-Za-z])",
+    re.MULTILINE)
+
+
+def _continues(previous, line):
+    # a line after a blank line that still belongs to the block before it:
+    # indented content, another item of the same list, more of a blockquote
+    if line[:1] in (" ", "\t"):
+        return True
+    if _LIST_ITEM.match(line) and _LIST_ITEM.match(previous):
+        return True
+    return line.startswith(">") and previous.startswith(">")
+
+
+def split_blocks(content):
+    """
+    Splits Markdown into top-level blocks that render the same on their
+    own as in the full document: paragraphs, headings, whole lists,
+    blockquotes and fenced code blocks.
+    """
+    blocks = []
+    current = []
+    in_fence = None
+    blank = False
+    for line in content.splitlines(keepends=True):
+        fence = _FENCE.match(line)
+        if in_fence:
+            current.append(line)
+            if fence and fence.group(1) == in_fence:
+                in_fence = None
+            continue
+        if not line.strip():
+            blank = True
+            current.append(line)
+            continue
+        if blank and current and not _continues(current[0], line):
+            blocks.append("".join(current))
+            current = []
+        blank = False
+        if fence:
+            in_fence = fence.group(1)
+        current.append(line)
+    if current:
+        blocks.append("".join(current))
+    return blocks
+
+
+class BlockRenderer:
+    """
+    Renders Markdown one top-level block at a time, reusing the html of
+    blocks whose text was rendered before, so that a small edit to a big
+    page only re-renders the blocks that changed.
+    """
+
+    def __init__(self, max_bytes):
+        # block hash -> html, shared by all pages
+        self.cache = RenderCache(max_bytes)
+
+    def render(self, content, convert):
+        """
+        Returns the html for content, calling convert(markdown) for the
+        whole document or for each block that is not cached.
+        """
+        if _DOCUMENT_WIDE.search(content):
+            return convert(content)
+        parts = []
+        for block in split_blocks(content):
+            digest = content_hash(block)
+            html = self.cache.get(digest, digest)
+            if html is None:
+                html = convert(block)
+                self.cache.put(digest, digest, html)
+            parts.append(html)
+        return "\n".join(parts)
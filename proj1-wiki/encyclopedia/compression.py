@@ -0,0 +1,127 @@
+import os
+import re
+import struct
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ZLIB = 0
+ZSTD = 1
+
+# every compressed entry starts with this: magic bytes, codec, and the id
+# of the dictionary it was compressed with (0 for none)
+_HEADER = struct.Struct(">3sBI")
+_MAGIC = b"WZ1"
+
+# zlib can only look back this far, so a bigger dictionary is wasted
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+
+def default_codec():
+    return ZSTD if zstandard is not None else ZLIB
+
+
+def dictionary_id(dictionary):
+    # never 0, which means "no dictionary"
+    return zlib.crc32(dictionary) or 1
+
+
+def train_dictionary(samples, codec, size=ZLIB_DICTIONARY_SIZE):
+    """
+    Builds a shared compression dictionary from sample entry texts (bytes).
+    zstd trains its own; for zlib the dictionary is the lines and words
+    that save the most bytes across the samples, most useful last.
+    """
+    if codec == ZSTD:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+    counts = Counter()
+    for sample in samples:
+        # count each string once per sample so one long page can't dominate
+        counts.update(set(sample.splitlines(keepends=True)))
+        counts.update(set(re.findall(rb"\w+\W", sample)))
+    useful = sorted(((len(text) * (count - 1), text) for text, count in counts.items() if count > 1),
+                    reverse=True)
+    chosen = []
+    total = 0
+    for _, text in useful:
+        if total + len(text) > size:
+            continue
+        chosen.append(text)
+        total += len(text)
+    # zlib finds matches closer to the end of the dictionary more cheaply
+    return b"".join(reversed(chosen))
+
+
+def compress(data, codec, dictionary=b""):
+    if codec == ZSTD:
+        params = {"dict_data": zstandard.ZstdCompressionDict(dictionary)} if dictionary else {}
+        payload = zstandard.ZstdCompressor(level=10, **params).compress(data)
+    else:
+        compressor = zlib.compressobj(9, zdict=dictionary) if dictionary else zlib.compressobj(9)
+        payload = compressor.compress(data) + compressor.flush()
+    dict_id = dictionary_id(dictionary) if dictionary else 0
+    return _HEADER.pack(_MAGIC, codec, dict_id) + payload
+
+
+def decompress(data, load_dictionary):
+    """
+    Decompresses data written by compress(). load_dictionary(id) must
+    return the dictionary with that id.
+    """
+    magic, codec, dict_id = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("not a compressed entry")
+    payload = data[_HEADER.size:]
+    dictionary = load_dictionary(dict_id) if dict_id else b""
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("this entry was compressed with zstd; install the zstandard package")
+        params = {"dict_data": zstandard.ZstdCompressionDict(dictionary)} if dictionary else {}
+        return zstandard.ZstdDecompressor(**params).decompress(payload)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(payload) + decompressor.flush()
+
+
+class DictionaryStore:
+    """
+    Dictionaries kept as <folder>/<id>.dict, with the id of the one new
+    entries are compressed with in <folder>/current. Old dictionaries are
+    kept so entries compressed before a retrain can still be read.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._loaded = {}
+
+    def load(self, dict_id):
+        if dict_id not in self._loaded:
+            with open(os.path.join(self.folder, f"{dict_id}.dict"), "rb") as f:
+                self._loaded[dict_id] = f.read()
+        return self._loaded[dict_id]
+
+    def current(self):
+        try:
+            with open(os.path.join(self.folder, "current")) as f:
+                return self.load(int(f.read()))
+        except FileNotFoundError:
+            return b""
+
+    def add(self, dictionary):
+        """
+        Saves dictionary and makes it the one used for new entries.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        dict_id = dictionary_id(dictionary)
+        with open(os.path.join(self.folder, f"{dict_id}.dict"), "wb") as f:
+            f.write(dictionary)
+        tmp = os.path.join(self.folder, "current.tmp")
+        with open(tmp, "w") as f:
+            f.write(str(dict_id))
+        os.replace(tmp, os.path.join(self.folder, "current"))
+        self._loaded[dict_id] = dictionary
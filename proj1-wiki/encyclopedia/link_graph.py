@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+from urllib.parse import unquote
+
+from . import util
+
+
+# /wiki/<title> targets of Markdown links, reference definitions and html hrefs
+_WIKI_LINK = re.compile(r"""(?:\]\(\s*|\]:\s*|href=["'])/wiki/([^\s)"'#?]+)""")
+
+
+def extract_links(content):
+    """
+    Returns the set of entry titles that Markdown content links to.
+    """
+    return {unquote(target) for target in _WIKI_LINK.findall(content)}
+
+
+class LinkGraph:
+    """
+    Which entries link to which. Titles are numbered once, and links are
+    kept as tuples of numbers from each page and sets of numbers into
+    each page, so "what links here" is a dictionary lookup.
+    """
+
+    def __init__(self):
+        # title <-> number
+        self._ids = None
+        self._titles = []
+        # number -> tuple of numbers it links to
+        self._outgoing = {}
+        # number -> set of numbers linking to it
+        self._incoming = {}
+        # numbers of the titles that are existing entries
+        self._existing = set()
+        # number -> when its backlinks or broken links last changed
+        self._changed = {}
+        self._lock = threading.RLock()
+
+    def _id(self, title):
+        number = self._ids.get(title)
+        if number is None:
+            number = self._ids[title] = len(self._titles)
+            self._titles.append(title)
+        return number
+
+    def _build(self):
+        self._ids = {}
+        self._titles = []
+        self._outgoing = {}
+        self._incoming = {}
+        self._existing = set()
+        self._changed = {}
+        for title in util.list_entries():
+            content = util.get_entry(title)
+            if content is not None:
+                self._existing.add(self._id(title))
+                self._set_links(title, content)
+
+    def _ensure_built(self):
+        if self._ids is None:
+            with self._lock:
+                if self._ids is None:
+                    self._build()
+
+    def _set_links(self, title, content, now=None):
+        source = self._id(title)
+        old = set(self._outgoing.get(source, ()))
+        new = {self._id(target) for target in extract_links(content)} if content is not None else set()
+        for target in old - new:
+            self._incoming[target].discard(source)
+        for target in new - old:
+            self._incoming.setdefault(target, set()).add(source)
+        if now is not None:
+            for target in old ^ new:
+                self._changed[target] = now
+        if new:
+            self._outgoing[source] = tuple(new)
+        else:
+            self._outgoing.pop(source, None)
+
+    # called by util.save_entry / util.reload_entries
+    def update(self, title, content):
+        with self._lock:
+            if self._ids is None:
+                return
+            now = time.time()
+            number = self._id(title)
+            self._set_links(title, content, now)
+            exists = content is not None
+            if exists != (number in self._existing):
+                # pages linking to a page that was just created or deleted
+                # have one broken link fewer or more
+                if exists:
+                    self._existing.add(number)
+                else:
+                    self._existing.discard(number)
+                for source in self._incoming.get(number, ()):
+                    self._changed[source] = now
+
+    def reset(self):
+        with self._lock:
+            self._ids = None
+
+    def backlinks(self, title):
+        """
+        Returns the sorted titles of entries that link to title.
+        """
+        self._ensure_built()
+        with self._lock:
+            number = self._ids.get(title)
+            sources = self._incoming.get(number, ()) if number is not None else ()
+            return sorted(self._titles[source] for source in sources)
+
+    def broken_links(self, title):
+        """
+        Returns the sorted titles that title links to but that do not exist.
+        """
+        self._ensure_built()
+        with self._lock:
+            number = self._ids.get(title)
+            targets = self._outgoing.get(number, ()) if number is not None else ()
+            return sorted(self._titles[target] for target in targets
+                          if target not in self._existing)
+
+    def changed_at(self, title):
+        """
+        Returns the time the backlinks or broken links of title last
+        changed, or 0 if they have not changed since the graph was built.
+        """
+        self._ensure_built()
+        with self._lock:
+            number = self._ids.get(title)
+            return self._changed.get(number, 0) if number is not None else 0
+
+
+link_graph = util.register_index(LinkGraph())
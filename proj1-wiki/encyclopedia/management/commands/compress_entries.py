@@ -0,0 +1,64 @@
+import os
+import random
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import compression
+from encyclopedia.storage import (AtomicFileBackend, CompressedFileBackend, ShardedCompressedFileBackend,
+                                  ShardedFileBackend)
+
+
+class Command(BaseCommand):
+    help = ("Trains a compression dictionary on a sample of the entries and converts .md entries "
+            "to the .mdz files used by WIKI_ENTRY_STORAGE = \"compressed\", or back with --decompress.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sharded", action="store_true",
+                            help="the entries folder uses the sharded layout")
+        parser.add_argument("--sample", type=int, default=2000,
+                            help="number of entries the dictionary is trained on")
+        parser.add_argument("--recompress", action="store_true",
+                            help="also recompress .mdz entries with the new dictionary")
+        parser.add_argument("--decompress", action="store_true",
+                            help="turn .mdz entries back into plain .md files")
+
+    def handle(self, *args, **options):
+        if options["sharded"]:
+            plain, compressed = ShardedFileBackend(), ShardedCompressedFileBackend()
+        else:
+            plain, compressed = AtomicFileBackend(), CompressedFileBackend()
+
+        if options["decompress"]:
+            converted = self._convert(compressed, plain)
+            self.stdout.write(self.style.SUCCESS(f"Decompressed {converted} entries."))
+            return
+
+        titles = plain.list_titles()
+        existing = compressed.list_titles()
+        sample = random.sample(titles + existing, min(options["sample"], len(titles) + len(existing)))
+        uncompressed = set(titles)
+        texts = [(plain.read(title) if title in uncompressed else compressed.read(title)) or ""
+                 for title in sample]
+        dictionary = compression.train_dictionary([text.encode("utf-8") for text in texts], compressed.codec)
+        compressed.dictionaries.add(dictionary)
+        self.stdout.write(f"Trained a {len(dictionary)} byte dictionary on {len(sample)} entries.")
+
+        converted = self._convert(plain, compressed)
+        if options["recompress"]:
+            for title in existing:
+                compressed.write_file(title, compressed.read(title))
+            converted += len(existing)
+        self.stdout.write(self.style.SUCCESS(f"Compressed {converted} entries."))
+
+    def _convert(self, source, target):
+        converted = 0
+        for title in source.list_titles():
+            content = source.read(title)
+            if content is None:
+                continue
+            # the new file is in place before the old one goes, so readers
+            # using either backend never find the entry missing
+            target.write_file(title, content)
+            os.remove(source.path(title))
+            converted += 1
+        return converted
@@ -0,0 +1,61 @@
+import io
+import tarfile
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import util
+
+
+# tar write modes by file extension, all streaming
+TAR_MODES = {
+    ".tar": "w|",
+    ".tar.gz": "w|gz",
+    ".tgz": "w|gz",
+    ".tar.bz2": "w|bz2",
+    ".tar.xz": "w|xz",
+}
+
+
+class Command(BaseCommand):
+    help = "Writes every encyclopedia entry into a tar or zip archive as entries/<title>.md."
+
+    def add_arguments(self, parser):
+        parser.add_argument("archive", help=".zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz file to create")
+
+    def handle(self, *args, **options):
+        path = options["archive"]
+        if path.endswith(".zip"):
+            exported = self._write_zip(path)
+        else:
+            mode = next((mode for ext, mode in TAR_MODES.items() if path.endswith(ext)), "w|gz")
+            exported = self._write_tar(path, mode)
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} entries to {path}."))
+
+    def _entries(self):
+        # one entry in memory at a time
+        for title in util.list_entries():
+            content = util.get_entry(title)
+            if content is not None:
+                yield title, content.encode("utf-8")
+
+    def _write_tar(self, path, mode):
+        exported = 0
+        now = time.time()
+        with tarfile.open(path, mode) as archive:
+            for title, data in self._entries():
+                info = tarfile.TarInfo(f"entries/{title}.md")
+                info.size = len(data)
+                info.mtime = now
+                archive.addfile(info, io.BytesIO(data))
+                exported += 1
+        return exported
+
+    def _write_zip(self, path):
+        exported = 0
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for title, data in self._entries():
+                archive.writestr(f"entries/{title}.md", data)
+                exported += 1
+        return exported
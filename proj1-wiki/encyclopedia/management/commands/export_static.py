@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from encyclopedia import util
+from encyclopedia.render_cache import content_hash
+from encyclopedia.views import convert_md_to_html
+
+
+# title -> content hash of every page written by the last export
+MANIFEST = ".export-manifest.json"
+
+# static pages have no request to take a csrf token from; this value makes
+# {% csrf_token %} in the layout render nothing instead of warning
+NO_CSRF = {"csrf_token": "NOTPROVIDED"}
+
+
+def _entry_dir(output, title):
+    return os.path.join(output, "wiki", title)
+
+
+def _write(path, html):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp, path)
+
+
+def _export_entry(job):
+    # runs in a worker process: returns the entry's hash, and whether it
+    # had to be rendered because it changed since the last export
+    title, previous_hash, output = job
+    content = util.get_entry(title)
+    if content is None:
+        return title, None, False
+    digest = content_hash(content)
+    page = os.path.join(_entry_dir(output, title), "index.html")
+    if digest == previous_hash and os.path.exists(page):
+        return title, digest, False
+    html = render_to_string("encyclopedia/entry.html", {
+        "title": title,
+        "content": convert_md_to_html(title, content),
+        **NO_CSRF,
+    })
+    _write(page, html)
+    return title, digest, True
+
+
+class Command(BaseCommand):
+    help = "Renders every encyclopedia entry and the index page into a folder of static html."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="folder to write the site into")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="number of rendering processes")
+        parser.add_argument("--force", action="store_true",
+                            help="re-render every entry, not only the changed ones")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        manifest_path = os.path.join(output, MANIFEST)
+        # read even with --force, which only skips the hash check, so that
+        # the pages of entries deleted since the last export are removed
+        previous = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                previous = json.load(f)
+
+        titles = util.list_entries()
+        jobs = [(title, None if options["force"] else previous.get(title), output) for title in titles]
+        manifest = {}
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options["workers"],
+                                 initializer=django.setup) as pool:
+            for title, digest, changed in pool.map(_export_entry, jobs, chunksize=256):
+                if digest is not None:
+                    manifest[title] = digest
+                rendered += changed
+
+        # pages of entries that no longer exist
+        removed = [title for title in previous if title not in manifest]
+        for title in removed:
+            shutil.rmtree(_entry_dir(output, title), ignore_errors=True)
+
+        if rendered or removed or not os.path.exists(os.path.join(output, "index.html")):
+            _write(os.path.join(output, "index.html"),
+                   render_to_string("encyclopedia/index.html", {"entries": titles, **NO_CSRF}))
+
+        _write(manifest_path, json.dumps(manifest))
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(manifest)} entries to {output}: "
+            f"{rendered} rendered, {len(manifest) - rendered} unchanged, {len(removed)} removed."))
@@ -0,0 +1,73 @@
+import os
+import tarfile
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import util
+
+
+def title_of(name):
+    """
+    Returns the entry title for a file name inside an archive, or None if
+    the file is not a Markdown entry. Folders in the name are ignored.
+    """
+    name = os.path.basename(name)
+    if not name.endswith(".md") or name.startswith("."):
+        return None
+    return name[:-3]
+
+
+def _decode(name, data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise CommandError(f"{name} is not UTF-8 text ({e.reason} at byte {e.start})")
+
+
+def _tar_entries(path):
+    # "r|*" reads the archive front to back as a stream, so members are
+    # never all held in memory, whatever the compression
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            title = title_of(member.name) if member.isfile() else None
+            if title is not None:
+                yield title, _decode(member.name, archive.extractfile(member).read())
+
+
+def _zip_entries(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            title = title_of(info.filename) if not info.is_dir() else None
+            if title is not None:
+                yield title, _decode(info.filename, archive.read(info))
+
+
+class Command(BaseCommand):
+    help = ("Saves every .md file in a tar or zip archive as an encyclopedia entry, "
+            "replacing entries with the same title.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("archive", help=".zip, .tar, .tar.gz, .tar.bz2 or .tar.xz file")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="number of entries written to storage at a time")
+
+    def handle(self, *args, **options):
+        path = options["archive"]
+        if zipfile.is_zipfile(path):
+            entries = _zip_entries(path)
+        elif tarfile.is_tarfile(path):
+            entries = _tar_entries(path)
+        else:
+            raise CommandError(f"{path} is not a zip or tar archive")
+
+        # entries saved before a bad member stay saved and are indexed
+        try:
+            saved = util.save_entries(entries, options["batch_size"])
+        except CommandError as e:
+            raise CommandError(f"Import stopped: {e}. Entries written before it are kept.")
+        except (tarfile.TarError, zipfile.BadZipFile, SuspiciousFileOperation) as e:
+            raise CommandError(f"Import stopped: {path} is damaged or has a bad entry: {e}. "
+                               "Entries written before it are kept.")
+        self.stdout.write(self.style.SUCCESS(f"Imported {saved} entries from {path}."))
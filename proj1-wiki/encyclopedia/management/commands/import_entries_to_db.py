@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia.storage import BACKENDS, SQLiteFTSBackend
+
+
+class Command(BaseCommand):
+    help = "Copies entries from the entries folder into the database used by WIKI_ENTRY_STORAGE = \"sqlite\"."
+
+    def add_arguments(self, parser):
+        # any of the entries folder layouts, not the database itself
+        parser.add_argument("--source", default="default",
+                            choices=[name for name, backend in BACKENDS.items() if backend is not SQLiteFTSBackend],
+                            help="layout of the entries folder to read from")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="number of entries written per query")
+
+    def handle(self, *args, **options):
+        source = BACKENDS[options["source"]]()
+        target = SQLiteFTSBackend()
+        batch_size = options["batch_size"]
+        batch = []
+        imported = 0
+        for title in source.list_titles():
+            content = source.read(title)
+            if content is None:
+                continue
+            batch.append((title, content))
+            if len(batch) >= batch_size:
+                # entries already in the database are overwritten with the file's text
+                target.write_many(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            target.write_many(batch)
+            imported += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} entries."))
@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia.storage import (AtomicFileBackend, CompressedFileBackend, ShardedCompressedFileBackend,
+                                  ShardedFileBackend)
+
+
+class Command(BaseCommand):
+    help = ("Moves the entries folder, and its edit history, into the hashed "
+            "subfolders used by WIKI_ENTRY_STORAGE = \"sharded\", or back with --flatten. "
+            "Use --compressed for the .mdz entries of \"compressed\" and \"sharded-compressed\".")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flatten", action="store_true",
+                            help="move sharded entries back into one flat folder")
+        parser.add_argument("--compressed", action="store_true",
+                            help="the entries are compressed .mdz files")
+
+    def handle(self, *args, **options):
+        if options["compressed"]:
+            flat = CompressedFileBackend()
+            sharded = ShardedCompressedFileBackend(flat.root)
+        else:
+            flat = AtomicFileBackend()
+            sharded = ShardedFileBackend(flat.root)
+        if options["flatten"]:
+            source, target = sharded, flat
+        else:
+            source, target = flat, sharded
+
+        moved = 0
+        for title in self._titles(source, options["flatten"]):
+            moved += self._move(source.path(title), target.path(title))
+            self._move(source.history_path(title), target.history_path(title))
+            if moved and moved % 10000 == 0:
+                self.stdout.write(f"{moved} entries moved")
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} entries in {flat.root}."))
+
+    def _titles(self, source, flatten):
+        if flatten:
+            return source.list_titles()
+        # iterate the flat folder lazily so that millions of names are never
+        # held in memory at once; entries are renamed, not copied
+        suffix = source.suffix
+        return (entry.name[:-len(suffix)] for entry in os.scandir(source.root)
+                if entry.name.endswith(suffix) and entry.is_file())
+
+    def _move(self, old, new):
+        if not os.path.exists(old):
+            return 0
+        os.makedirs(os.path.dirname(new), exist_ok=True)
+        os.replace(old, new)
+        return 1
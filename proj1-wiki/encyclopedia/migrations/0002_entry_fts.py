@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+# fts5 index over encyclopedia_entry that stores no text of its own, and
+# triggers that keep it in step with inserts, updates and deletes
+FTS_SQL = [
+    """CREATE VIRTUAL TABLE encyclopedia_entry_fts USING fts5(
+        title, content, content='encyclopedia_entry', content_rowid='id')""",
+    """CREATE TRIGGER encyclopedia_entry_ai AFTER INSERT ON encyclopedia_entry BEGIN
+        INSERT INTO encyclopedia_entry_fts(rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER encyclopedia_entry_ad AFTER DELETE ON encyclopedia_entry BEGIN
+        INSERT INTO encyclopedia_entry_fts(encyclopedia_entry_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER encyclopedia_entry_au AFTER UPDATE ON encyclopedia_entry BEGIN
+        INSERT INTO encyclopedia_entry_fts(encyclopedia_entry_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO encyclopedia_entry_fts(rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS encyclopedia_entry_au",
+    "DROP TRIGGER IF EXISTS encyclopedia_entry_ad",
+    "DROP TRIGGER IF EXISTS encyclopedia_entry_ai",
+    "DROP TABLE IF EXISTS encyclopedia_entry_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # fts5 is sqlite only; other databases just get the plain table
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FTS_SQL), _run(DROP_SQL)),
+    ]
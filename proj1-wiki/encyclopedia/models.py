@@ -1,3 +1,13 @@
 from django.db import models
 
 # Create your models here.
+
+# an encyclopedia entry, used only when WIKI_ENTRY_STORAGE = "sqlite";
+# the migration adds an fts5 index over it, kept in sync by triggers
+class Entry(models.Model):
+    title = models.CharField(max_length=255, unique=True)
+    content = models.TextField()
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
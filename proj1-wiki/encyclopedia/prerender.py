@@ -0,0 +1,48 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+class Prerenderer:
+    """
+    Renders entries on a small pool of background threads as soon as
+    they are saved, so the first reader finds the html already in the
+    render cache. A title queued again before its render starts is only
+    rendered once.
+    """
+
+    def __init__(self, render, workers):
+        # render(title) converts the entry and stores the html in the cache
+        self._render = render
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wiki-prerender")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def enqueue(self, title):
+        with self._lock:
+            if title in self._pending:
+                return
+            self._pending.add(title)
+        self._pool.submit(self._run, title)
+
+    def _run(self, title):
+        # a save arriving while this render runs queues the title again
+        with self._lock:
+            self._pending.discard(title)
+        try:
+            self._render(title)
+        except Exception:
+            logger.exception("could not pre-render entry %r", title)
+
+    # called by util.save_entry / util.refresh_entry; registered after the
+    # render cache, so the old html has already been dropped
+    def update(self, title, content):
+        if content is not None:
+            self.enqueue(title)
+
+    # bulk imports and reloads are not rendered ahead of time
+    def reset(self):
+        pass
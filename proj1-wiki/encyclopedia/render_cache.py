@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(content):
+    """
+    Returns a hex digest identifying one version of an entry's Markdown.
+    """
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Least-recently-used cache of rendered entry HTML, keyed by title and
+    the hash of the Markdown it was rendered from, and bounded by the
+    total size of the cached HTML in bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # title -> (content hash, html, size in bytes), oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, title, digest):
+        with self._lock:
+            cached = self._entries.get(title)
+            if cached is None or cached[0] != digest:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(title)
+            self.hits += 1
+            return cached[1]
+
+    def put(self, title, digest, html):
+        size = len(html.encode("utf-8"))
+        with self._lock:
+            self._discard(title)
+            # a page bigger than the whole budget is never worth keeping
+            if size > self.max_bytes:
+                return
+            self._entries[title] = (digest, html, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def invalidate(self, title):
+        with self._lock:
+            self._discard(title)
+
+    def _discard(self, title):
+        cached = self._entries.pop(title, None)
+        if cached is not None:
+            self._bytes -= cached[2]
+
+    # called by util.save_entry / util.reload_entries
+    def update(self, title, content):
+        self.invalidate(title)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
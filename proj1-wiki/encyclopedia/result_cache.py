@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+
+class SearchResultCache:
+    """
+    Least-recently-used cache of the full results of recent searches,
+    so that the "More results" pages of a query are sliced from the list
+    made for its first page instead of searching again. Bounded by the
+    total number of titles held, and emptied whenever an entry changes.
+    """
+
+    def __init__(self, max_titles):
+        self.max_titles = max_titles
+        # query -> (titles, title -> position in titles, suggestions)
+        self._results = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        with self._lock:
+            cached = self._results.get(query)
+            if cached is not None:
+                self._results.move_to_end(query)
+            return cached
+
+    def put(self, query, titles, suggestions):
+        """
+        Stores the results of query and returns them as they are kept:
+        (titles, positions, suggestions).
+        """
+        cached = (titles, {title: i for i, title in enumerate(titles)}, suggestions)
+        with self._lock:
+            if len(titles) > self.max_titles:
+                return cached
+            old = self._results.pop(query, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._results[query] = cached
+            self._size += len(titles)
+            while self._size > self.max_titles:
+                _, (evicted, _, _) = self._results.popitem(last=False)
+                self._size -= len(evicted)
+        return cached
+
+    # called by util.save_entry / util.reload_entries: any change can add
+    # or remove a match of any query
+    def update(self, title, content):
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._results.clear()
+            self._size = 0
@@ -0,0 +1,156 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from . import util
+
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Splits text into lowercased word tokens.
+    """
+    return _WORD.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Inverted index over entry titles and Markdown bodies, ranked with
+    BM25. Built from the entries folder on the first search and then
+    updated one entry at a time by util.save_entry.
+    """
+
+    # a word in the title counts as much as this many words in the body
+    TITLE_WEIGHT = 3
+    # when only the best limit results are asked for, a term found in more
+    # entries than this is only scored for the entries it occurs in most
+    # often, so that a query for a common word costs about as much as one
+    # for a rare word; the entries skipped are the ones the word matters
+    # least in, which rarely rank near the top. With limit=None every
+    # matching entry is scored and returned
+    MAX_POSTINGS = 1000
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {title: weighted term frequency}
+        self._postings = None
+        # title -> terms of that entry, needed to remove it again
+        self._doc_terms = {}
+        # title -> weighted length of that entry in tokens
+        self._lengths = {}
+        self._total_length = 0
+        # term -> the MAX_POSTINGS postings of a common term with the
+        # highest frequency, as a sorted list of (-tf, title); made on the
+        # first search for the term and kept up to date after that
+        self._top = {}
+        self._lock = threading.RLock()
+
+    def _build(self):
+        self._postings = {}
+        self._top = {}
+        self._doc_terms = {}
+        self._lengths = {}
+        self._total_length = 0
+        for title in util.list_entries():
+            content = util.get_entry(title)
+            if content is not None:
+                self._add(title, content)
+
+    def _ensure_built(self):
+        if self._postings is None:
+            with self._lock:
+                if self._postings is None:
+                    self._build()
+
+    def _add(self, title, content):
+        counts = Counter(tokenize(content))
+        for term in tokenize(title):
+            counts[term] += self.TITLE_WEIGHT
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[title] = tf
+            top = self._top.get(term)
+            if top is not None:
+                insort(top, (-tf, title))
+                del top[self.MAX_POSTINGS:]
+        length = sum(counts.values())
+        self._doc_terms[title] = tuple(counts)
+        self._lengths[title] = length
+        self._total_length += length
+
+    def _remove(self, title):
+        for term in self._doc_terms.pop(title, ()):
+            docs = self._postings[term]
+            top = self._top.get(term)
+            if top is not None:
+                i = bisect_left(top, (-docs[title], title))
+                if i < len(top) and top[i][1] == title:
+                    del top[i]
+                # made again from the postings on the next search once
+                # too many of the best ones have gone
+                if len(top) < self.MAX_POSTINGS // 2:
+                    del self._top[term]
+            del docs[title]
+            if not docs:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(title, 0)
+
+    # called by util.save_entry / util.reload_entries
+    def update(self, title, content):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(title)
+            if content is not None:
+                self._add(title, content)
+
+    def reset(self):
+        with self._lock:
+            self._postings = None
+
+    def _top_postings(self, term, docs):
+        top = self._top.get(term)
+        if top is None:
+            top = heapq.nsmallest(self.MAX_POSTINGS, ((-tf, title) for title, tf in docs.items()))
+            self._top[term] = top
+        return [(title, -neg_tf) for neg_tf, title in top]
+
+    def search(self, query, limit=50):
+        """
+        Returns up to limit titles matching the query (all of them if
+        limit is None), best match first.
+        """
+        self._ensure_built()
+        with self._lock:
+            n = len(self._lengths)
+            if n == 0:
+                return []
+            avg_length = self._total_length / n
+            scores = Counter()
+            for term in set(tokenize(query)):
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                df = len(docs)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                if limit is not None and df > self.MAX_POSTINGS:
+                    postings = self._top_postings(term, docs)
+                else:
+                    postings = docs.items()
+                for title, tf in postings:
+                    norm = 1 - self.b + self.b * self._lengths[title] / avg_length
+                    scores[title] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        key = lambda item: (item[1], item[0])
+        if limit is None:
+            best = sorted(scores.items(), key=key, reverse=True)
+        else:
+            best = heapq.nlargest(limit, scores.items(), key=key)
+        return [title for title, _ in best]
+
+
+search_index = util.register_index(SearchIndex())
@@ -0,0 +1,44 @@
+// type-ahead for the sidebar search box, filled from the autocomplete route
+document.addEventListener('DOMContentLoaded', () => {
+    const input = document.querySelector('input.search[data-autocomplete-url]');
+    if (!input) {
+        return;
+    }
+    const options = document.querySelector('#' + input.getAttribute('list'));
+    // completions already fetched, by query
+    const cache = {};
+    let timer = null;
+
+    const show = (titles) => {
+        options.innerHTML = '';
+        titles.forEach(title => {
+            const option = document.createElement('option');
+            option.value = title;
+            options.append(option);
+        });
+    };
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query === '') {
+            show([]);
+            return;
+        }
+        if (cache[query]) {
+            show(cache[query]);
+            return;
+        }
+        // wait for a short pause in typing before asking the server
+        timer = setTimeout(() => {
+            fetch(`${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`)
+            .then(response => response.json())
+            .then(data => {
+                cache[query] = data.results;
+                if (input.value.trim() === query) {
+                    show(data.results);
+                }
+            });
+        }, 150);
+    });
+});
@@ -0,0 +1,397 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models.functions import Length
+from django.utils.module_loading import import_string
+
+from . import compression
+from .models import Entry
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+class DefaultStorageBackend:
+    """
+    Stores each entry as entries/<title>.md through Django's
+    default_storage. Saving replaces a file by deleting and re-creating it.
+    """
+
+    def list_titles(self):
+        _, filenames = default_storage.listdir("entries")
+        return [re.sub(r"\.md$", "", filename)
+                for filename in filenames if filename.endswith(".md")]
+
+    def read(self, title):
+        try:
+            with default_storage.open(f"entries/{title}.md") as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def stat(self, title):
+        filename = f"entries/{title}.md"
+        try:
+            modified = default_storage.get_modified_time(filename).timestamp()
+            return modified, default_storage.size(filename)
+        except FileNotFoundError:
+            return None
+
+    def write(self, title, content):
+        filename = f"entries/{title}.md"
+        if default_storage.exists(filename):
+            default_storage.delete(filename)
+        default_storage.save(filename, ContentFile(content))
+
+    def write_many(self, entries):
+        # overwrite the files in place, skipping the exists and delete calls
+        # of write(), when the storage is on the local disk
+        for title, content in entries:
+            try:
+                path = default_storage.path(f"entries/{title}.md")
+            except NotImplementedError:
+                self.write(title, content)
+                continue
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+    def revisions(self, title):
+        return []
+
+
+# one history record: its length, then the zlib-compressed json
+_RECORD_HEADER = struct.Struct(">I")
+
+
+def make_delta(new, old):
+    """
+    Returns the operations that turn the lines of new back into old:
+    ["c", i, j] copies lines i:j of new, ["i", text] inserts text.
+    """
+    new_lines = new.splitlines(keepends=True)
+    old_lines = old.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, new_lines, old_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif j1 < j2:
+            ops.append(["i", "".join(old_lines[j1:j2])])
+    return ops
+
+
+def apply_delta(new, ops):
+    """
+    Rebuilds the older text from new and the operations of make_delta.
+    """
+    new_lines = new.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if op[0] == "c":
+            parts.extend(new_lines[op[1]:op[2]])
+        else:
+            parts.append(op[1])
+    return "".join(parts)
+
+
+class AtomicFileBackend:
+    """
+    Stores each entry as a file under the entries folder. A save writes
+    a temporary file and renames it over the old one, so readers see
+    either the old or the new page but never a missing one. The replaced
+    version is appended to entries/.history/<title>.hist as a compressed
+    delta against the version that replaced it.
+    """
+
+    # file name extension of entries
+    suffix = ".md"
+
+    # number of locks that titles are spread over by hash
+    LOCK_STRIPES = 64
+
+    def __init__(self, root=None):
+        self.root = root or default_storage.path("entries")
+        # serialise saves of the same title within this process, while
+        # saves of other titles (mostly) get a different lock; fcntl
+        # locks on the matching lock file do the same between processes
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def filename(self, title, suffix=None):
+        """
+        Returns the file name of an entry, refusing titles that would
+        leave the entries folder or hide among .history and temp files.
+        """
+        if (not title or title.startswith(".") or "\0" in title
+                or any(sep in title for sep in ("/", "\\", os.sep, os.altsep) if sep)):
+            raise SuspiciousFileOperation(f"invalid entry title {title!r}")
+        return f"{title}{self.suffix if suffix is None else suffix}"
+
+    def path(self, title):
+        return os.path.join(self.root, self.filename(title))
+
+    def history_path(self, title):
+        return os.path.join(self.root, ".history", self.filename(title, ".hist"))
+
+    def list_titles(self):
+        with os.scandir(self.root) as it:
+            return [entry.name[:-len(self.suffix)] for entry in it
+                    if entry.name.endswith(self.suffix) and entry.is_file()]
+
+    # how entry text is turned into file contents and back
+    def encode(self, content):
+        return content.encode("utf-8")
+
+    def decode(self, data):
+        return data.decode("utf-8")
+
+    def read(self, title):
+        try:
+            with open(self.path(title), "rb") as f:
+                return self.decode(f.read())
+        except FileNotFoundError:
+            return None
+
+    def stat(self, title):
+        try:
+            result = os.stat(self.path(title))
+        except FileNotFoundError:
+            return None
+        return result.st_mtime, result.st_size
+
+    def _replace(self, path, content):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.encode(content))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def write_file(self, title, content):
+        """
+        Atomically replaces the entry's file without recording history.
+        """
+        self._replace(self.path(title), content)
+
+    def lock_path(self, title):
+        """
+        Returns the lock file that saves of title take between processes,
+        one of LOCK_STRIPES files in .history shared by many titles.
+        """
+        return os.path.join(self.root, ".history", f".lock-{self._stripe(title):02d}")
+
+    def _stripe(self, title):
+        # the same in every process, unlike hash()
+        return zlib.crc32(title.encode("utf-8")) % self.LOCK_STRIPES
+
+    def write(self, title, content):
+        # checks the title before anything is created for it
+        path = self.path(title)
+        lock_path = self.lock_path(title)
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with self._locks[self._stripe(title)], open(lock_path, "ab") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            old = self.read(title)
+            self._replace(path, content)
+            # the history file only exists once there is a version to keep
+            if old is not None and old != content:
+                record = json.dumps({"time": time.time(), "delta": make_delta(content, old)})
+                data = zlib.compress(record.encode("utf-8"))
+                history = self.history_path(title)
+                os.makedirs(os.path.dirname(history), exist_ok=True)
+                with open(history, "ab") as log:
+                    log.write(_RECORD_HEADER.pack(len(data)) + data)
+
+    def write_many(self, entries):
+        for title, content in entries:
+            self.write(title, content)
+
+    def _records(self, title):
+        try:
+            with open(self.history_path(title), "rb") as log:
+                data = log.read()
+        except FileNotFoundError:
+            return []
+        records = []
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            (size,) = _RECORD_HEADER.unpack_from(data, offset)
+            offset += _RECORD_HEADER.size
+            records.append(json.loads(zlib.decompress(data[offset:offset + size])))
+            offset += size
+        return records
+
+    def revisions(self, title):
+        current = self.read(title)
+        if current is None:
+            return []
+        revisions = []
+        for record in reversed(self._records(title)):
+            current = apply_delta(current, record["delta"])
+            revisions.append((record["time"], current))
+        return revisions
+
+
+def shard_of(title):
+    """
+    Returns the two-level subfolder, like "3f/a2", that a title is kept
+    in by ShardedFileBackend.
+    """
+    digest = hashlib.md5(title.encode("utf-8")).hexdigest()
+    return os.path.join(digest[:2], digest[2:4])
+
+
+class ShardedFileBackend(AtomicFileBackend):
+    """
+    AtomicFileBackend that spreads entries over 65536 subfolders of the
+    entries folder by a hash of the title, keeping every folder small
+    even with millions of entries. Use manage.py reshard_entries to
+    move an existing flat folder into this layout.
+    """
+
+    def path(self, title):
+        return os.path.join(self.root, shard_of(title), self.filename(title))
+
+    def history_path(self, title):
+        return os.path.join(self.root, ".history", shard_of(title), self.filename(title, ".hist"))
+
+    def list_titles(self):
+        titles = []
+        for first in _subfolders(self.root):
+            for second in _subfolders(first):
+                with os.scandir(second) as it:
+                    titles.extend(entry.name[:-len(self.suffix)] for entry in it
+                                  if entry.name.endswith(self.suffix) and entry.is_file())
+        return titles
+
+
+def _subfolders(path):
+    # shard folders only, which leaves out .history
+    with os.scandir(path) as it:
+        return [entry.path for entry in it
+                if entry.is_dir() and not entry.name.startswith(".")]
+
+
+class CompressedFileBackend(AtomicFileBackend):
+    """
+    AtomicFileBackend that keeps entries as <title>.mdz files, compressed
+    with zstd when the zstandard package is installed and zlib otherwise,
+    against a dictionary shared by the whole corpus in
+    entries/.dictionaries. manage.py compress_entries trains the
+    dictionary and converts existing entries.
+    """
+
+    suffix = ".mdz"
+
+    def __init__(self, root=None):
+        super().__init__(root)
+        self.codec = compression.default_codec()
+        self.dictionaries = compression.DictionaryStore(os.path.join(self.root, ".dictionaries"))
+        self._dictionary = None
+
+    def encode(self, content):
+        # the dictionary is read once; a retrain is picked up on restart
+        if self._dictionary is None:
+            self._dictionary = self.dictionaries.current()
+        return compression.compress(content.encode("utf-8"), self.codec, self._dictionary)
+
+    def decode(self, data):
+        return compression.decompress(data, self.dictionaries.load).decode("utf-8")
+
+
+class ShardedCompressedFileBackend(CompressedFileBackend, ShardedFileBackend):
+    """
+    Compressed entries in the sharded folder layout.
+    """
+
+
+class SQLiteFTSBackend:
+    """
+    Stores entries as rows of the Entry model in the project database,
+    with an fts5 index over titles and contents (see migration 0002) that
+    answers full-text searches. Use manage.py import_entries_to_db to
+    copy the entries folder into it.
+    """
+
+    def list_titles(self):
+        return list(Entry.objects.values_list("title", flat=True))
+
+    def read(self, title):
+        return Entry.objects.filter(title=title).values_list("content", flat=True).first()
+
+    def stat(self, title):
+        row = (Entry.objects.filter(title=title)
+               .values_list("modified", Length("content")).first())
+        if row is None:
+            return None
+        return row[0].timestamp(), row[1]
+
+    def write(self, title, content):
+        Entry.objects.update_or_create(title=title, defaults={"content": content})
+
+    def write_many(self, entries):
+        # one insert for the whole batch; existing titles are overwritten
+        Entry.objects.bulk_create(
+            [Entry(title=title, content=content) for title, content in entries],
+            update_conflicts=True, unique_fields=["title"], update_fields=["content", "modified"])
+
+    def revisions(self, title):
+        return []
+
+    def search(self, query, limit=50):
+        # quote every word so that fts5 operators typed by users are
+        # taken literally, and match entries with any of them
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " OR ".join('"' + word + '"' for word in words)
+        with connection.cursor() as cursor:
+            # bm25 weights: a title match counts three times a body match
+            cursor.execute(
+                "SELECT title FROM encyclopedia_entry_fts "
+                "WHERE encyclopedia_entry_fts MATCH %s "
+                "ORDER BY bm25(encyclopedia_entry_fts, 3.0, 1.0) LIMIT %s",
+                # a negative limit means no limit to sqlite
+                [match, -1 if limit is None else limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    "default": DefaultStorageBackend,
+    "atomic": AtomicFileBackend,
+    "sharded": ShardedFileBackend,
+    "compressed": CompressedFileBackend,
+    "sharded-compressed": ShardedCompressedFileBackend,
+    "sqlite": SQLiteFTSBackend,
+}
+
+
+def get_backend():
+    """
+    Creates the entry storage backend named by WIKI_ENTRY_STORAGE, either
+    one of the names in BACKENDS or the dotted path of a class.
+    """
+    name = getattr(settings, "WIKI_ENTRY_STORAGE", "default")
+    backend_class = BACKENDS.get(name) or import_string(name)
+    return backend_class()
@@ -1,3 +1,736 @@
-from django.test import TestCase
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from importlib import import_module, reload
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches, resolve, reverse
+
+from markdown2 import Markdown
+
+from . import apps as apps_module, async_views, util, views, watcher
+from .blocks import BlockRenderer
+from .link_graph import LinkGraph
+from .models import Entry
+from .prerender import Prerenderer
+from .render_cache import RenderCache, content_hash
+from .search_index import SearchIndex
+from .trigram_index import TrigramIndex
+from .storage import (AtomicFileBackend, CompressedFileBackend, ShardedCompressedFileBackend, ShardedFileBackend,
+                      shard_of)
 
 # Create your tests here.
+
+
+class EntriesTestCase(TestCase):
+    """
+    Runs each test against an empty entries folder in a temporary
+    MEDIA_ROOT, stored with the backend named by storage.
+    """
+
+    storage = "default"
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix="wiki-test-")
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.root = os.path.join(self.media_root, "entries")
+        os.makedirs(self.root)
+
+        override = self.settings(MEDIA_ROOT=self.media_root, WIKI_ENTRY_STORAGE=self.storage)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.use_storage()
+        # the next test must not see this test's backend or entries
+        self.addCleanup(self.use_storage)
+
+        # background renders would read entries from other threads while
+        # the test's transaction is open
+        if hasattr(views, "prerenderer"):
+            patcher = mock.patch.object(views.prerenderer, "enqueue")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_storage(self):
+        util._backend = None
+        util.reload_entries()
+
+
+class TitleValidationTests(EntriesTestCase):
+
+    storage = "atomic"
+
+    def test_backends_refuse_titles_outside_the_folder(self):
+        for backend in (AtomicFileBackend(self.root), ShardedFileBackend(self.root),
+                        ShardedCompressedFileBackend(self.root)):
+            for title in ("../escaped", "a/b", "..", ".history", "a\\b", ""):
+                with self.subTest(backend=type(backend).__name__, title=title):
+                    with self.assertRaises(SuspiciousFileOperation):
+                        backend.write(title, "hi")
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "escaped.md")))
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_create_page_rejects_traversal(self):
+        response = self.client.post(reverse("create_page"),
+                                    {"title": "../escaped", "page_content": "hi"})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "escaped.md")))
+
+
+class OtherProcessTests(EntriesTestCase):
+    """
+    Entries created or deleted by another worker process, which only
+    shows up in storage and not in this process's title index.
+    """
+
+    def write_file(self, title, content):
+        with open(os.path.join(self.root, f"{title}.md"), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_entry_created_elsewhere_is_found(self):
+        util.save_entry("Old", "# Old")
+        self.write_file("New", "# New\n\nfrom another process")
+
+        self.assertEqual(util.get_entry("New"), "# New\n\nfrom another process")
+        self.assertIn("New", util.list_entries())
+        response = self.client.get(reverse("entry", args=["New"]))
+        self.assertContains(response, "from another process")
+
+    def test_create_page_does_not_overwrite_entry_created_elsewhere(self):
+        util.list_entries()
+        self.write_file("New", "# New\n\nfirst")
+
+        response = self.client.post(reverse("create_page"), {"title": "New", "page_content": "second"})
+        self.assertContains(response, "page already exist")
+        self.assertEqual(util.get_entry("New"), "# New\n\nfirst")
+
+    def test_entry_deleted_elsewhere_is_dropped(self):
+        util.save_entry("Gone", "# Gone")
+        os.remove(os.path.join(self.root, "Gone.md"))
+
+        self.assertIsNone(util.get_entry("Gone"))
+        self.assertNotIn("Gone", util.list_entries())
+
+
+# pages that must render the same one block at a time as in one piece
+MARKDOWN_FIXTURES = [
+    "# Title\n\nA paragraph\nover two lines.\n\n## Section\n\nAnother *one*.\n",
+    "- one\n- two\n\n- three, loose\n\n    indented part of three\n\nAfter the list.\n",
+    "1. first\n2. second\n\n3. third\n\nText.\n",
+    "> quoted\n\n> still quoted\n\nNot quoted.\n",
+    "```\ncode\n\n# not a heading\n```\n\nText after the fence.\n",
+    "~~~\n```\n\n~~~\n\nText.\n",
+    "    indented code\n\n    more code\n\nText.\n",
+    "<div>\n\ninner\n\n</div>\n\nText after the div.\n",
+    "Intro.\n\n<table>\n<tr><td>a</td></tr>\n\n</table>\n",
+    "<!-- a comment\n\nover blank lines -->\n\nText.\n",
+    "See <https://example.com> for more.\n\n<https://example.com>\n\nEnd.\n",
+    "A [reference link][ref].\n\n[ref]: https://example.com\n",
+    "Text with a footnote[^1].\n\n[^1]: The note.\n",
+    "Line one  \nhard break.\n\n***\n\nAfter a rule.\n",
+]
+
+
+class BlockRenderingTests(TestCase):
+
+    def normalise(self, html):
+        # the blocks are joined with newlines, so only compare the markup
+        return re.sub(r">\s+<", "><", html.strip())
+
+    def test_blocks_render_like_the_whole_page(self):
+        fixtures = list(MARKDOWN_FIXTURES)
+        entries = os.path.join(settings.BASE_DIR, "entries")
+        for name in sorted(os.listdir(entries)):
+            with open(os.path.join(entries, name), encoding="utf-8") as f:
+                fixtures.append(f.read())
+
+        for content in fixtures:
+            with self.subTest(content=content[:40]):
+                renderer = BlockRenderer(1024 * 1024)
+                blocks = renderer.render(content, Markdown().convert)
+                whole = Markdown().convert(content)
+                self.assertEqual(self.normalise(blocks), self.normalise(whole))
+
+
+
+class RenderCacheTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = RenderCache(10)
+        util.register_index(self.cache)
+        self.addCleanup(util._indexes.remove, self.cache)
+
+    def test_hits_misses_and_eviction(self):
+        self.assertIsNone(self.cache.get("A", "1"))
+        self.cache.put("A", "1", "<p>a</p>")
+        self.assertEqual(self.cache.get("A", "1"), "<p>a</p>")
+        # html of another version of the page is not served
+        self.assertIsNone(self.cache.get("A", "2"))
+
+        # over the byte budget the least recently used page goes first
+        self.cache.put("B", "1", "b")
+        self.assertEqual(self.cache.get("A", "1"), "<p>a</p>")
+        self.cache.put("C", "1", "cc")
+        self.assertIsNone(self.cache.get("B", "1"))
+        self.assertEqual(self.cache.get("A", "1"), "<p>a</p>")
+        # a page bigger than the budget is never kept
+        self.cache.put("D", "1", "<p>too big</p>")
+        self.assertIsNone(self.cache.get("D", "1"))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 4))
+        self.assertLessEqual(stats["bytes"], 10)
+
+    def test_save_invalidates(self):
+        util.save_entry("A", "a")
+        self.cache.put("A", content_hash("a"), "<p>a</p>")
+        util.save_entry("A", "a")
+        self.assertIsNone(self.cache.get("A", content_hash("a")))
+
+
+class PrerenderTests(TestCase):
+
+    def test_titles_queued_twice_render_once(self):
+        rendered = []
+        release = threading.Event()
+
+        def render(title):
+            # holds the only worker until the other titles are queued
+            if title == "Busy":
+                release.wait(5)
+            rendered.append(title)
+
+        prerenderer = Prerenderer(render, workers=1)
+        prerenderer.enqueue("Busy")
+        for title in ("A", "B", "A", "A"):
+            prerenderer.update(title, "saved")
+        prerenderer.update("C", None)
+        release.set()
+        prerenderer._pool.shutdown(wait=True)
+        self.assertEqual(rendered, ["Busy", "A", "B"])
+
+class SearchPagingTests(EntriesTestCase):
+
+    def test_more_results_reaches_every_match(self):
+        titles = [f"Widget{i:03d}" for i in range(260)]
+        others = [f"Page{i:03d}" for i in range(60)]
+        util.save_entries([(title, "# title match") for title in titles]
+                          + [(title, "mentions a widget in the text") for title in others])
+
+        found = []
+        url = f"{reverse('search')}?q=widget"
+        # more text matches than the search index scores for a capped search
+        with mock.patch.object(views, "PAGE_SIZE", 50), \
+                mock.patch.object(views.search_index, "MAX_POSTINGS", 10):
+            while url:
+                response = self.client.get(url)
+                found += response.context["search_result"]
+                after = response.context["next_after"]
+                url = f"{reverse('search')}?q=widget&after={after}" if after else None
+
+        # title matches first, in order, then the full-text matches
+        self.assertEqual(found[:260], titles)
+        self.assertEqual(sorted(found[260:]), others)
+
+    def test_later_pages_do_not_search_again(self):
+        util.save_entries([(f"Widget{i:02d}", "text") for i in range(5)])
+        url = reverse('search')
+        with mock.patch.object(views, "PAGE_SIZE", 2), \
+                mock.patch.object(views, "search_results", wraps=views.search_results) as search:
+            first = self.client.get(url, {"q": "widget"})
+            second = self.client.get(url, {"q": "widget", "after": first.context["next_after"]})
+            self.assertEqual(search.call_count, 1)
+            self.assertEqual(second.context["search_result"], ["Widget02", "Widget03"])
+
+            # a save changes what matches, so the query is searched again
+            util.save_entry("Widget05", "text")
+            last = self.client.get(url, {"q": "widget", "after": "Widget03"})
+            self.assertEqual(search.call_count, 2)
+            self.assertEqual(last.context["search_result"], ["Widget04", "Widget05"])
+
+    def test_after_no_longer_in_results_gives_empty_page(self):
+        util.save_entries([(f"Widget{i:02d}", "text") for i in range(5)])
+        response = self.client.get(reverse('search'), {"q": "widget", "after": "Widget99"})
+        self.assertEqual(response.context["search_result"], [])
+        self.assertIsNone(response.context["next_after"])
+
+
+
+class AutocompleteTests(EntriesTestCase):
+
+    def test_titles_starting_with_query(self):
+        util.save_entries([(title, "text") for title in ("Python", "pytest", "PyPy", "Django")])
+        response = self.client.get(reverse("autocomplete"), {"q": "py", "limit": "2"})
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json(), {"query": "py", "results": ["PyPy", "pytest"]})
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+
+        self.assertEqual(self.client.get(reverse("autocomplete")).json()["results"], [])
+        self.assertEqual(self.client.post(reverse("autocomplete"), {"q": "py"}).status_code, 405)
+
+
+class RandomPageTests(EntriesTestCase):
+
+    def test_empty_wiki(self):
+        response = self.client.get(reverse("random"))
+        self.assertContains(response, "there are no pages yet")
+
+    def test_redirects_to_an_entry(self):
+        util.save_entries([("Python", "text"), ("Django", "text")])
+        seen = {self.client.get(reverse("random"))["Location"] for _ in range(40)}
+        self.assertEqual(seen, {reverse("entry", args=[title]) for title in ("Python", "Django")})
+
+class IndexPagingTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.titles = [f"Entry{i:03d}" for i in range(7)]
+        util.save_entries([(title, "text") for title in self.titles])
+
+    def test_after_pages_cover_every_entry_once(self):
+        found, after = [], None
+        with mock.patch.object(views, "PAGE_SIZE", 3):
+            while True:
+                response = self.client.get(reverse('index'), {"after": after} if after else {})
+                found += response.context["entries"]
+                after = response.context["next_after"]
+                if after is None:
+                    break
+        self.assertEqual(found, self.titles)
+
+    def test_all_streams_every_entry(self):
+        with mock.patch.object(views, "PAGE_SIZE", 3):
+            response = self.client.get(reverse('index'), {"all": "1"})
+        self.assertTrue(response.streaming)
+        html = b"".join(response.streaming_content).decode()
+        self.assertEqual(re.findall(r'<li><a href="[^"]+">(\w+)</a></li>', html), self.titles)
+        self.assertIn("</html>", html.lower())
+
+
+class SearchIndexTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = SearchIndex()
+        util.register_index(self.index)
+        self.addCleanup(util._indexes.remove, self.index)
+
+    def test_bm25_ranking(self):
+        util.save_entries([
+            ("Python", "A language."),
+            ("Snakes", "The python is a snake. A python can be long."),
+            ("Languages", "Python, Go and Rust are languages; python is one of many."),
+            ("Cooking", "Nothing about it."),
+        ])
+        # a title match outweighs body mentions; more mentions rank higher
+        self.assertEqual(self.index.search("python"), ["Python", "Snakes", "Languages"])
+        self.assertEqual(self.index.search("snake rust", limit=1), ["Snakes"])
+        self.assertEqual(self.index.search("missing"), [])
+
+    def test_save_entry_updates_index(self):
+        util.save_entries([("Python", "A language."), ("Go", "Another language.")])
+        self.assertEqual(self.index.search("quokka"), [])
+
+        util.save_entry("Go", "Has a quokka mascot?")
+        self.assertEqual(self.index.search("quokka"), ["Go"])
+        self.assertEqual(self.index.search("another"), [])
+
+        util.save_entry("Rust", "Quokka quokka quokka.")
+        self.assertEqual(self.index.search("quokka"), ["Rust", "Go"])
+
+    def test_common_terms_score_their_best_postings(self):
+        self.index.MAX_POSTINGS = 10
+        util.save_entries([(f"Page{i:02d}", "common " * (1 + i % 5)) for i in range(40)])
+        # the entries mentioning the word most
+        self.assertEqual(set(self.index.search("common", limit=50)),
+                         {f"Page{i:02d}" for i in range(40) if i % 5 == 4} | {"Page03", "Page08"})
+        # asking for every match scores every posting
+        self.assertEqual(len(self.index.search("common", limit=None)), 40)
+
+        # kept up to date by saves
+        util.save_entry("Page00", "common " * 20)
+        self.assertEqual(self.index.search("common")[0], "Page00")
+        util.save_entry("Page00", "gone")
+        self.assertNotIn("Page00", self.index.search("common", limit=50))
+        self.assertEqual(len(self.index.search("common", limit=None)), 39)
+
+
+class TrigramIndexTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = TrigramIndex()
+        util.register_index(self.index)
+        self.addCleanup(util._indexes.remove, self.index)
+        util.save_entries([(title, "text") for title in ("Python", "CPython", "Jython", "Django", "Go")])
+
+    def test_substring_matches(self):
+        self.assertEqual(self.index.substring_matches("YTHON"), ["CPython", "Jython", "Python"])
+        self.assertEqual(self.index.substring_matches("ython", limit=2), ["CPython", "Jython"])
+        self.assertEqual(self.index.substring_matches("pyx"), [])
+        # queries too short for a trigram
+        self.assertEqual(self.index.substring_matches("go", limit=None), ["Django", "Go"])
+        self.assertEqual(self.index.substring_matches("j"), ["Django", "Jython"])
+
+        util.save_entry("Gopher", "text")
+        os.remove(os.path.join(self.root, "Django.md"))
+        util.refresh_entry("Django")
+        self.assertEqual(self.index.substring_matches("go"), ["Go", "Gopher"])
+
+    def test_similar(self):
+        self.assertEqual(self.index.similar("pyhton", limit=1), ["Python"])
+        self.assertEqual(self.index.similar("djang"), ["Django"])
+        self.assertEqual(self.index.similar("zzzz"), [])
+
+    def test_similar_when_every_trigram_is_common(self):
+        # every trigram of "python" is in at least the three *ython titles
+        self.index.MAX_POSTINGS = 2
+        util.save_entries([(f"Python{i}", "text") for i in range(10)])
+        # only a sample of the titles sharing the rarest one is compared
+        suggestions = self.index.similar("python", limit=10)
+        self.assertTrue(suggestions)
+        self.assertLessEqual(len(suggestions), 2)
+        self.assertTrue(all(title.endswith("ython") for title in suggestions))
+
+
+class AtomicStorageTests(EntriesTestCase):
+
+    storage = "atomic"
+
+    def test_revisions_round_trip(self):
+        versions = ["# Page\n\nfirst\n", "# Page\n\nfirst\nsecond\n", "# Page\n\nthird\n"]
+        history = os.path.join(self.root, ".history", "Page.hist")
+        util.save_entry("Page", versions[0])
+        # nothing to record yet, so no history file
+        self.assertFalse(os.path.exists(history))
+        for content in versions[1:]:
+            util.save_entry("Page", content)
+        # saving the same text again records nothing
+        util.save_entry("Page", versions[-1])
+
+        self.assertEqual(util.get_entry("Page"), versions[-1])
+        self.assertEqual([content for _, content in util.get_revisions("Page")],
+                         list(reversed(versions[:-1])))
+        # no temporary files are left behind
+        self.assertEqual(sorted(os.listdir(self.root)), [".history", "Page.md"])
+        self.assertEqual(util.get_revisions("Missing"), [])
+
+
+class ShardedStorageTests(EntriesTestCase):
+
+    storage = "sharded"
+
+    def test_entries_are_kept_in_hashed_folders(self):
+        util.save_entry("Python", "# Python")
+        util.save_entry("Python", "# Python\n\nedited")
+        path = os.path.join(self.root, shard_of("Python"), "Python.md")
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(util.list_entries(), ["Python"])
+        self.assertEqual(util.get_entry("Python"), "# Python\n\nedited")
+        self.assertEqual(len(util.get_revisions("Python")), 1)
+
+    def reshard_round_trip(self, flat, sharded, flag):
+        titles = [f"Page{i}" for i in range(20)]
+        for title in titles:
+            flat.write(title, f"# {title}")
+        flat.write("Page0", "# Page0\n\nedited")
+
+        call_command("reshard_entries", *flag, stdout=StringIO())
+        self.assertEqual(flat.list_titles(), [])
+        self.assertEqual(sorted(sharded.list_titles()), sorted(titles))
+        self.assertEqual(sharded.read("Page3"), "# Page3")
+        self.assertEqual(len(sharded.revisions("Page0")), 1)
+
+        call_command("reshard_entries", "--flatten", *flag, stdout=StringIO())
+        self.assertEqual(sharded.list_titles(), [])
+        self.assertEqual(sorted(flat.list_titles()), sorted(titles))
+        self.assertEqual(flat.read("Page0"), "# Page0\n\nedited")
+        self.assertEqual(len(flat.revisions("Page0")), 1)
+
+    def test_reshard_round_trip(self):
+        self.reshard_round_trip(AtomicFileBackend(self.root), ShardedFileBackend(self.root), [])
+
+    def test_reshard_compressed_round_trip(self):
+        self.reshard_round_trip(CompressedFileBackend(self.root), ShardedCompressedFileBackend(self.root),
+                                ["--compressed"])
+
+
+@skipUnless(connection.vendor == "sqlite", "the full-text index is an sqlite fts5 table")
+class SQLiteStorageTests(EntriesTestCase):
+
+    storage = "sqlite"
+
+    def test_search_and_upsert(self):
+        util.save_entries([
+            ("Python", "A programming language."),
+            ("Snakes", "The python is a snake."),
+            ("Cooking", "Nothing about it."),
+        ], batch_size=2)
+        self.assertEqual(util.list_entries(), ["Cooking", "Python", "Snakes"])
+        # a title match ranks first
+        self.assertEqual(util.search_entries("python"), ["Python", "Snakes"])
+        # fts5 syntax typed by users is taken literally
+        self.assertEqual(util.search_entries('python" OR NOT "x'), ["Python", "Snakes"])
+
+        # write_many overwrites existing rows, and the triggers update the index
+        util.save_entries([("Snakes", "Only lizards here."), ("Go", "Gophers and pythons.")])
+        self.assertEqual(Entry.objects.count(), 4)
+        self.assertEqual(util.get_entry("Snakes"), "Only lizards here.")
+        self.assertEqual(util.search_entries("python"), ["Python"])
+        self.assertEqual(util.search_entries("lizards"), ["Snakes"])
+
+        util.save_entry("Cooking", "Python recipes.")
+        self.assertEqual(util.search_entries("python"), ["Python", "Cooking"])
+
+    def test_import_from_every_file_layout(self):
+        for source, backend in (("compressed", CompressedFileBackend),
+                                ("sharded-compressed", ShardedCompressedFileBackend)):
+            with self.subTest(source=source):
+                backend(self.root).write(f"From {source}", "Imported text.")
+                call_command("import_entries_to_db", "--source", source, stdout=StringIO())
+                self.assertEqual(Entry.objects.get(title=f"From {source}").content, "Imported text.")
+
+        with self.assertRaises(CommandError):
+            call_command("import_entries_to_db", "--source", "sqlite", stdout=StringIO())
+
+
+class LinkGraphTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.graph = LinkGraph()
+        util.register_index(self.graph)
+        self.addCleanup(util._indexes.remove, self.graph)
+
+    def test_links_follow_saves_and_deletes(self):
+        util.save_entry("Python", "See [Django](/wiki/Django) and [Flask](/wiki/Flask).")
+        util.save_entry("Django", "A framework.")
+        self.assertEqual(self.graph.backlinks("Django"), ["Python"])
+        self.assertEqual(self.graph.broken_links("Python"), ["Flask"])
+        before = self.graph.changed_at("Python")
+
+        # creating the missing page fixes the broken link
+        util.save_entry("Flask", "Links back to [Python](/wiki/Python).")
+        self.assertEqual(self.graph.broken_links("Python"), [])
+        self.assertEqual(self.graph.backlinks("Python"), ["Flask"])
+        self.assertGreater(self.graph.changed_at("Python"), before)
+
+        # editing a page away from a link removes its backlink
+        util.save_entry("Python", "Only [Flask](/wiki/Flask) now.")
+        self.assertEqual(self.graph.backlinks("Django"), [])
+
+        # deleting a page breaks the links to it
+        os.remove(os.path.join(self.root, "Flask.md"))
+        util.refresh_entry("Flask")
+        self.assertEqual(self.graph.broken_links("Python"), ["Flask"])
+        self.assertEqual(self.graph.backlinks("Python"), [])
+
+
+class ConditionalEntryTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entry("Python", "# Python")
+        self.url = reverse("entry", args=["Python"])
+
+    def test_fresh_copy_gets_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+
+        response = self.client.get(self.url, headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get(self.url, headers={"If-Modified-Since": first["Last-Modified"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_backlink_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        util.save_entry("Django", "Written in [Python](/wiki/Python).")
+
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.context["backlinks"], ["Django"])
+
+
+
+class AsyncViewTests(EntriesTestCase):
+    """
+    The index, entry and search pages served by the async views, as
+    encyclopedia/urls.py routes them when WIKI_ASYNC_VIEWS is True.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # cleanups run last first: the setting is undone, then urls reloaded
+        self.addCleanup(self.reload_urls)
+        override = self.settings(WIKI_ASYNC_VIEWS=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.reload_urls()
+        self.assertIs(resolve(reverse("entry", args=["Python"])).func, async_views.entry)
+        util.save_entries([("Python", "# Python"), ("Django", "Written in [Python](/wiki/Python).")])
+
+    def reload_urls(self):
+        # urls.py picks its views when it is imported
+        for name in ("encyclopedia.urls", "wiki.urls"):
+            reload(import_module(name))
+        clear_url_caches()
+
+    async def test_index(self):
+        response = await self.async_client.get(reverse("index"))
+        self.assertEqual(response.context["entries"], ["Django", "Python"])
+
+        response = await self.async_client.get(reverse("index"), {"all": "1"})
+        html = b"".join([part async for part in response.streaming_content]).decode()
+        self.assertIn(f'<a href="{reverse("entry", args=["Django"])}">Django</a>', html)
+
+    async def test_entry(self):
+        url = reverse("entry", args=["Python"])
+        response = await self.async_client.get(url)
+        self.assertContains(response, "<h1>Python</h1>")
+        self.assertEqual(response.context["backlinks"], ["Django"])
+
+        response = await self.async_client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(reverse("entry", args=["Missing"]))
+        self.assertContains(response, "page does not exist")
+
+    async def test_search(self):
+        response = await self.async_client.get(reverse("search"), {"q": "Python"})
+        self.assertRedirects(response, reverse("entry", args=["Python"]), fetch_redirect_response=False)
+
+        response = await self.async_client.get(reverse("search"), {"q": "jang"})
+        self.assertEqual(response.context["search_result"], ["Django"])
+
+class ArchiveTests(EntriesTestCase):
+
+    ENTRIES = {"Python": "# Python\n\nA language.\n", "Café": "# Café\n\nünïcode\n", "Go": ""}
+
+    def clear_entries(self):
+        for name in os.listdir(self.root):
+            os.remove(os.path.join(self.root, name))
+        util.reload_entries()
+
+    def test_export_import_round_trip(self):
+        util.save_entries(self.ENTRIES.items())
+        for name in ("wiki.zip", "wiki.tar.gz"):
+            with self.subTest(archive=name):
+                archive = os.path.join(self.media_root, name)
+                call_command("export_entries", archive, stdout=StringIO())
+                self.clear_entries()
+                self.assertEqual(util.list_entries(), [])
+
+                out = StringIO()
+                call_command("import_entries", archive, stdout=out)
+                self.assertIn("Imported 3 entries", out.getvalue())
+                self.assertEqual({title: util.get_entry(title) for title in util.list_entries()},
+                                 self.ENTRIES)
+
+    def test_bad_member_is_reported_and_earlier_entries_indexed(self):
+        archive = os.path.join(self.media_root, "bad.zip")
+        with zipfile.ZipFile(archive, "w") as f:
+            f.writestr("entries/Good.md", "# Good")
+            f.writestr("entries/Bad.md", b"\xff\xfe not utf-8")
+
+        # the title index is already loaded, so it must be rebuilt after the failure
+        self.assertEqual(util.list_entries(), [])
+        with self.assertRaisesMessage(CommandError, "entries/Bad.md is not UTF-8 text"):
+            call_command("import_entries", archive, "--batch-size", "1", stdout=StringIO())
+        self.assertEqual(util.list_entries(), ["Good"])
+        self.assertEqual(util.get_entry("Good"), "# Good")
+
+
+class WatcherStartTests(EntriesTestCase):
+
+    @override_settings(WIKI_WATCH_ENTRIES=True)
+    def test_watcher_starts_on_first_request_only(self):
+        self.addCleanup(setattr, apps_module, "_watcher", None)
+        with mock.patch("encyclopedia.watcher.start_watcher") as start_watcher:
+            # what manage.py commands do: load the apps, serve nothing
+            django_apps.get_app_config("encyclopedia").ready()
+            start_watcher.assert_not_called()
+
+            self.client.get(reverse("index"))
+            self.client.get(reverse("index"))
+            start_watcher.assert_called_once_with()
+
+
+@skipUnless(watcher.Observer is not None, "the watchdog package is not installed")
+class WatchdogTests(EntriesTestCase):
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def test_writes_refresh_and_reads_do_not(self):
+        util.save_entry("Python", "# Python")
+        observer = watcher.start_watcher(self.root)
+        self.addCleanup(observer.join)
+        self.addCleanup(observer.stop)
+
+        with mock.patch.object(util, "refresh_entry") as refresh_entry:
+            with open(os.path.join(self.root, "Copied.md"), "w") as f:
+                f.write("# Copied")
+            self.assertTrue(self.wait_for(lambda: mock.call("Copied") in refresh_entry.call_args_list))
+
+            # opening and reading an entry is not a change
+            time.sleep(0.3)
+            refresh_entry.reset_mock()
+            for _ in range(5):
+                util.get_entry("Python")
+            time.sleep(0.5)
+            refresh_entry.assert_not_called()
+
+
+class ExportStaticTests(EntriesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.output = os.path.join(self.media_root, "site")
+        util.save_entries([("Alpha", "# Alpha"), ("Beta", "# Beta")])
+
+    def export(self, *args):
+        out = StringIO()
+        call_command("export_static", self.output, "--workers", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def page(self, title):
+        return os.path.join(self.output, "wiki", title, "index.html")
+
+    def test_incremental_export(self):
+        self.assertIn("2 rendered, 0 unchanged, 0 removed", self.export())
+        self.assertIn("0 rendered, 2 unchanged, 0 removed", self.export())
+
+        util.save_entry("Alpha", "# Alpha\n\nedited")
+        self.assertIn("1 rendered, 1 unchanged, 0 removed", self.export())
+        with open(self.page("Alpha"), encoding="utf-8") as f:
+            self.assertIn("edited", f.read())
+
+    def test_forced_export_removes_deleted_entries(self):
+        self.export()
+        os.remove(os.path.join(self.root, "Beta.md"))
+        util.refresh_entry("Beta")
+
+        self.assertIn("1 rendered, 0 unchanged, 1 removed", self.export("--force"))
+        self.assertFalse(os.path.exists(self.page("Beta")))
+        self.assertTrue(os.path.exists(self.page("Alpha")))
+        self.assertIn("0 rendered, 1 unchanged, 0 removed", self.export())
@@ -0,0 +1,150 @@
+import heapq
+import threading
+from itertools import islice
+
+from . import util
+
+
+def trigrams(text, padded=True):
+    """
+    Returns the set of three-character substrings of text. Padding adds
+    trigrams for the start and end of the word, which helps fuzzy
+    matching of short titles.
+    """
+    if padded:
+        text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def short_grams(text):
+    """
+    Returns the set of one and two-character substrings of text, used to
+    look up queries too short to have a trigram.
+    """
+    return {text[i:i + n] for n in (1, 2) for i in range(len(text) - n + 1)}
+
+
+class TrigramIndex:
+    """
+    Index from trigrams of lowercased entry titles to the titles that
+    contain them, used for partial and typo-tolerant title matching.
+    One and two-character substrings are indexed too, so that short
+    queries don't have to check every title.
+    """
+
+    # how similar (shared / all trigrams) a title must be to be suggested
+    MIN_SIMILARITY = 0.25
+    # trigrams found in more titles than this don't bring in fuzzy
+    # candidates, and when every trigram of a query is that common only
+    # this many of the titles sharing its rarest one are compared, which
+    # keeps the cost of a lookup bounded
+    MAX_POSTINGS = 5000
+
+    def __init__(self):
+        # trigram, or substring of one or two characters -> set of titles
+        self._postings = None
+        # title -> lowercased title
+        self._lowered = {}
+        # title -> number of distinct trigrams in it
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def _build(self):
+        self._postings = {}
+        self._lowered = {}
+        self._sizes = {}
+        for title in util.list_entries():
+            self._add(title)
+
+    def _ensure_built(self):
+        if self._postings is None:
+            with self._lock:
+                if self._postings is None:
+                    self._build()
+
+    def _add(self, title):
+        lowered = title.lower()
+        grams = trigrams(lowered)
+        self._lowered[title] = lowered
+        self._sizes[title] = len(grams)
+        for gram in grams | short_grams(lowered):
+            self._postings.setdefault(gram, set()).add(title)
+
+    def _remove(self, title):
+        lowered = self._lowered.pop(title, None)
+        if lowered is None:
+            return
+        del self._sizes[title]
+        for gram in trigrams(lowered) | short_grams(lowered):
+            titles = self._postings[gram]
+            titles.discard(title)
+            if not titles:
+                del self._postings[gram]
+
+    # called by util.save_entry / util.reload_entries
+    def update(self, title, content):
+        with self._lock:
+            if self._postings is None:
+                return
+            if content is None:
+                self._remove(title)
+            elif title not in self._lowered:
+                self._add(title)
+
+    def reset(self):
+        with self._lock:
+            self._postings = None
+
+    def substring_matches(self, query, limit=200):
+        """
+        Returns up to limit titles (all of them if limit is None), in
+        sorted order, that contain the query ignoring case.
+        """
+        self._ensure_built()
+        query = query.lower()
+        with self._lock:
+            grams = trigrams(query, padded=False)
+            if grams:
+                postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set.intersection(*postings)
+                matches = [title for title in candidates if query in self._lowered[title]]
+            elif query:
+                # too short to have a trigram: the titles containing it
+                # are indexed as they are
+                matches = list(self._postings.get(query, ()))
+            else:
+                matches = list(self._lowered)
+        if limit is None:
+            return sorted(matches)
+        return heapq.nsmallest(limit, matches)
+
+    def similar(self, query, limit=5):
+        """
+        Returns up to limit titles that look like the query, most similar
+        first, for "did you mean" suggestions.
+        """
+        self._ensure_built()
+        grams = trigrams(query.lower())
+        with self._lock:
+            postings = [self._postings[gram] for gram in grams if gram in self._postings]
+            selective = [titles for titles in postings if len(titles) <= self.MAX_POSTINGS]
+            if selective:
+                candidates = set().union(*selective)
+            elif postings:
+                # every trigram is common: only compare a bounded sample of
+                # the titles sharing the rarest one
+                candidates = islice(min(postings, key=len), self.MAX_POSTINGS)
+            else:
+                candidates = ()
+            # candidates are compared on all the query's trigrams, common
+            # ones included
+            shared = {title: sum(title in titles for titles in postings) for title in candidates}
+            scored = []
+            for title, count in shared.items():
+                similarity = count / (len(grams) + self._sizes[title] - count)
+                if similarity >= self.MIN_SIMILARITY:
+                    scored.append((similarity, title))
+        return [title for _, title in heapq.nlargest(limit, scored)]
+
+
+trigram_index = util.register_index(TrigramIndex())
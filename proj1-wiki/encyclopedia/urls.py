@@ -1,13 +1,22 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+# under asgi, the pages readers hit most can be served by async views
+if getattr(settings, "WIKI_ASYNC_VIEWS", False):
+    from . import async_views as reading_views
+else:
+    reading_views = views
+
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("search", views.search, name="search"),
+    path("", reading_views.index, name="index"),
+    path("search", reading_views.search, name="search"),
+    path("autocomplete", views.autocomplete, name="autocomplete"),
     path("createpage", views.create_page, name="create_page"),
     # dynamic path, str:title is passed onto views.entry. url name is entry
-    path("wiki/<str:title>", views.entry, name="entry"),
+    path("wiki/<str:title>", reading_views.entry, name="entry"),
     path("edit/<str:title>", views.edit, name="edit"),
-    path("random", views.rand, name="random")
+    path("random", views.rand, name="random"),
+    path("stats/render-cache", views.render_cache_stats, name="render_cache_stats")
 ]
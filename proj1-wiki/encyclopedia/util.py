@@ -1,16 +1,155 @@
-import re
+import random
+import threading
+from bisect import bisect_left, bisect_right, insort
 
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from django.core.exceptions import SuspiciousFileOperation
+
+from .storage import get_backend
+
+
+# where entries are kept, chosen by the WIKI_ENTRY_STORAGE setting
+_backend = None
+
+
+def _storage():
+    global _backend
+    if _backend is None:
+        _backend = get_backend()
+    return _backend
+
+
+# process-wide sorted list of entry titles, loaded from disk on first use
+# and kept up to date by save_entry, so reads never rescan the directory
+_titles = None
+_titles_lock = threading.Lock()
+
+# other in-process caches and indexes built from the entries; each one
+# gets update(title, content) after an entry is saved or changed on disk
+# (content is None if it was deleted) and reset() when everything it
+# holds should be thrown away
+_indexes = []
+
+
+def _load_titles():
+    return sorted(_storage().list_titles())
+
+
+def _title_index():
+    global _titles
+    if _titles is None:
+        with _titles_lock:
+            if _titles is None:
+                _titles = _load_titles()
+    return _titles
+
+
+def _index_contains(titles, title):
+    i = bisect_left(titles, title)
+    return i < len(titles) and titles[i] == title
+
+
+def reload_entries():
+    """
+    Drops the in-memory title index, and every registered index, so
+    that they are rebuilt from the entries directory on next use.
+    """
+    global _titles
+    with _titles_lock:
+        _titles = None
+    for index in _indexes:
+        index.reset()
+
+
+def register_index(index):
+    """
+    Registers an object with update(title, content) and reset()
+    methods to be kept in sync with saved entries. Returns the object
+    so that it can be used at module level.
+    """
+    _indexes.append(index)
+    return index
+
+
+def _notify(title, content):
+    for index in _indexes:
+        index.update(title, content)
 
 
 def list_entries():
     """
     Returns a list of all names of encyclopedia entries.
     """
-    _, filenames = default_storage.listdir("entries")
-    return list(sorted(re.sub(r"\.md$", "", filename)
-                for filename in filenames if filename.endswith(".md")))
+    return list(_title_index())
+
+
+def list_entries_page(after=None, limit=200):
+    """
+    Returns up to limit entry titles in alphabetical order, starting
+    after the title given as after (or at the first title), and the
+    title to pass as after for the next page, or None on the last page.
+    """
+    titles = _title_index()
+    with _titles_lock:
+        start = bisect_right(titles, after) if after is not None else 0
+        page = titles[start:start + limit]
+        more = start + limit < len(titles)
+    return page, (page[-1] if more and page else None)
+
+
+def entry_exists(title):
+    """
+    Returns True if an encyclopedia entry with the given title exists,
+    using a binary search over the in-memory title index. A title missing
+    from the index is looked up in storage too, since another process
+    may have created it since the index was loaded.
+    """
+    if _index_contains(_title_index(), title):
+        return True
+    return _read_missing(title) is not None
+
+
+def _read_missing(title):
+    # an entry saved by another worker process is not in this process's
+    # index yet; read it from storage and add it if it is there
+    try:
+        content = _storage().read(title)
+    except SuspiciousFileOperation:
+        return None
+    if content is not None:
+        _update_index(title, content)
+    return content
+
+
+def _update_index(title, content):
+    titles = _title_index()
+    with _titles_lock:
+        i = bisect_left(titles, title)
+        present = i < len(titles) and titles[i] == title
+        if content is None and present:
+            del titles[i]
+        elif content is not None and not present:
+            titles.insert(i, title)
+    _notify(title, content)
+
+
+def refresh_entry(title):
+    """
+    Brings the title index, and every registered index, up to date with
+    an entry that was created, changed or deleted without save_entry,
+    for example by copying files into the entries folder.
+    """
+    _update_index(title, _storage().read(title))
+
+
+def random_entry():
+    """
+    Returns the title of a randomly chosen encyclopedia entry, or None
+    if there are no entries. The title index is an array, so this takes
+    constant time.
+    """
+    titles = _title_index()
+    with _titles_lock:
+        return random.choice(titles) if titles else None
 
 
 def save_entry(title, content):
@@ -19,10 +158,39 @@ def save_entry(title, content):
     content. If an existing entry with the same title already exists,
     it is replaced.
     """
-    filename = f"entries/{title}.md"
-    if default_storage.exists(filename):
-        default_storage.delete(filename)
-    default_storage.save(filename, ContentFile(content))
+    _storage().write(title, content)
+
+    titles = _title_index()
+    with _titles_lock:
+        if not _index_contains(titles, title):
+            insort(titles, title)
+    _notify(title, content)
+
+
+def save_entries(entries, batch_size=1000):
+    """
+    Saves many encyclopedia entries, given an iterable of (title,
+    content) pairs, writing them to storage in batches. The title index
+    and every registered index are rebuilt once at the end rather than
+    updated per entry, even if saving stops part way with an error, so
+    the entries written before it are not left out. Returns the number
+    of entries saved.
+    """
+    saved = 0
+    batch = []
+    try:
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                _storage().write_many(batch)
+                saved += len(batch)
+                batch = []
+        if batch:
+            _storage().write_many(batch)
+            saved += len(batch)
+    finally:
+        reload_entries()
+    return saved
 
 
 def get_entry(title):
@@ -30,8 +198,41 @@ def get_entry(title):
     Retrieves an encyclopedia entry by its title. If no such
     entry exists, the function returns None.
     """
-    try:
-        f = default_storage.open(f"entries/{title}.md")
-        return f.read().decode("utf-8")
-    except FileNotFoundError:
+    if not _index_contains(_title_index(), title):
+        return _read_missing(title)
+    content = _storage().read(title)
+    if content is None:
+        # deleted by another process; drop it from the indexes
+        _update_index(title, None)
+    return content
+
+
+def search_entries(query, limit=50):
+    """
+    Returns up to limit titles of entries matching the query (all of
+    them if limit is None), best match first, if the storage has its own
+    full-text index, or None if it does not.
+    """
+    storage = _storage()
+    if not hasattr(storage, "search"):
+        return None
+    return storage.search(query, limit)
+
+
+def get_entry_stat(title):
+    """
+    Returns (modification time as a timestamp, size in bytes) of an
+    encyclopedia entry without reading it, or None if it does not exist.
+    """
+    if not entry_exists(title):
         return None
+    return _storage().stat(title)
+
+
+def get_revisions(title):
+    """
+    Returns the earlier versions of an encyclopedia entry as a list of
+    (timestamp, content) pairs, newest first. Only storage that keeps
+    history has any.
+    """
+    return _storage().revisions(title)
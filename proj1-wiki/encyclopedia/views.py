@@ -1,32 +1,155 @@
+import threading
+from datetime import datetime, timezone
+
 from markdown2 import Markdown
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.html import format_html
 from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from . import util
-import random
+from .autocomplete import title_completer
+from .blocks import BlockRenderer
+from .link_graph import link_graph
+from .prerender import Prerenderer
+from .render_cache import RenderCache, content_hash
+from .result_cache import SearchResultCache
+from .search_index import search_index
+from .trigram_index import trigram_index
 
 # markdowner = Markdown()
 # markdowner.convert("*boo!*")
 
+# how many titles the index and search results pages show at a time
+PAGE_SIZE = getattr(settings, "WIKI_PAGE_SIZE", 200)
+
+# rendered html of recently viewed entries, dropped whenever an entry is saved
+render_cache = util.register_index(RenderCache(
+    getattr(settings, "WIKI_RENDER_CACHE_BYTES", 32 * 1024 * 1024)))
+
+# pages at least this big are rendered block by block, so that after an
+# edit only the changed blocks go through markdown2 again
+INCREMENTAL_RENDER_BYTES = getattr(settings, "WIKI_INCREMENTAL_RENDER_BYTES", 64 * 1024)
+block_renderer = BlockRenderer(getattr(settings, "WIKI_BLOCK_CACHE_BYTES", 32 * 1024 * 1024))
+
+# full results of recent searches, so "More results" pages don't search again;
+# dropped whenever an entry is saved
+search_cache = util.register_index(SearchResultCache(
+    getattr(settings, "WIKI_SEARCH_CACHE_TITLES", 100000)))
+
+# a Markdown instance can be reused between conversions, but not shared
+# between threads
+_markdowners = threading.local()
+
+
+def _markdowner():
+    if not hasattr(_markdowners, "instance"):
+        _markdowners.instance = Markdown()
+    return _markdowners.instance
+
+
 # convert stored .md files in entries folder to html using markdown2 package
-def convert_md_to_html(title):
-    content = util.get_entry(title)
-    markdowner = Markdown()
+# pass content when the caller has already read the entry from disk
+def convert_md_to_html(title, content=None):
+    if content is None:
+        content = util.get_entry(title)
     if content == None:
         return None
-    else:
-        return markdowner.convert(content)
+
+    digest = content_hash(content)
+    html = render_cache.get(title, digest)
+    if html is None:
+        if len(content) >= INCREMENTAL_RENDER_BYTES:
+            html = block_renderer.render(content, _markdowner().convert)
+        else:
+            html = _markdowner().convert(content)
+        render_cache.put(title, digest, html)
+    return html
+
+# renders saved entries in the background so readers don't wait for markdown2
+PRERENDER_WORKERS = getattr(settings, "WIKI_PRERENDER_WORKERS", 2)
+if PRERENDER_WORKERS:
+    prerenderer = util.register_index(Prerenderer(convert_md_to_html, PRERENDER_WORKERS))
 
 # passing a variable entries as a dictionary to the home page
+# one page of titles at a time: ?after=<last title of the previous page>
+# ?all=1 streams every title instead, sending the first bytes straight away
 def index(request):
+    if request.GET.get('all'):
+        return StreamingHttpResponse(_stream_index(request))
+
+    entries, next_after = util.list_entries_page(request.GET.get('after'), PAGE_SIZE)
     return render(request, "encyclopedia/index.html", {
-        "entries": util.list_entries()
+        "entries": entries,
+        "next_after": next_after
     })
 
+# the index page with the list items written out one page of titles at a time
+def _stream_index(request):
+    head, tail = stream_index_parts(request)
+    yield head
+    entries, next_after = util.list_entries_page(None, PAGE_SIZE)
+    while entries:
+        yield index_items(entries)
+        if next_after is None:
+            break
+        entries, next_after = util.list_entries_page(next_after, PAGE_SIZE)
+    yield tail
+
+# the html of the index page before and after its list items
+def stream_index_parts(request):
+    marker = "<!-- entries -->"
+    return render_to_string("encyclopedia/index.html",
+        {"stream_marker": marker}, request).split(marker)
+
+def index_items(entries):
+    return "".join(format_html('<li><a href="{}">{}</a></li>\n', reverse('entry', args=[entry]), entry)
+                   for entry in entries)
+
+# one page of an already computed list of titles, following the title given
+# as after. positions maps each title to its place in titles; an after that
+# is no longer in the list (its entry was deleted or renamed since the last
+# page) gives an empty last page rather than starting over from the first
+def page_of(titles, positions, after, limit):
+    start = 0
+    if after is not None:
+        if after not in positions:
+            return [], None
+        start = positions[after] + 1
+    page = titles[start:start + limit]
+    more = start + limit < len(titles)
+    return page, (page[-1] if more and page else None)
+
+
+# validators for conditional GET on entry pages: both only stat the file and
+# look up the link graph, so a client with a fresh copy gets a 304 without
+# the page being read
+def entry_etag(request, title):
+    stat = util.get_entry_stat(title)
+    if stat is None:
+        return None
+    modified, size = stat
+    links_changed = link_graph.changed_at(title)
+    return f"{int(modified * 1000000):x}-{size:x}-{int(links_changed * 1000000):x}"
+
+def entry_last_modified(request, title):
+    stat = util.get_entry_stat(title)
+    if stat is None:
+        return None
+    # the backlinks shown on the page can change without the entry changing
+    modified = max(stat[0], link_graph.changed_at(title))
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
 
 # every time u are building a fn for a webpage
+@condition(etag_func=entry_etag, last_modified_func=entry_last_modified)
 def entry(request, title):
     # check if the name is in our list of entries
-    if util.get_entry(title) == None:
+    markdown = util.get_entry(title)
+    if markdown == None:
         return render(request, "encyclopedia/error.html",
             {"message": "page does not exist"})
 
@@ -34,16 +157,54 @@ def entry(request, title):
 
     # if yes render entry page
     else:
-        content = convert_md_to_html(title)
+        content = convert_md_to_html(title, markdown)
         return render(request, "encyclopedia/entry.html",
-            {"title": title, "content": content})
+            {"title": title, "content": content,
+             "backlinks": link_graph.backlinks(title),
+             "broken_links": link_graph.broken_links(title)})
 
+# titles matching a search query that is not an exact title, and titles
+# that look like a misspelling of it. All matches are returned, not just
+# the first page, so "More results" can reach every one of them
+def search_results(query):
+    # titles containing the query, looked up by their trigrams
+    search_result = trigram_index.substring_matches(query, limit=None)
+
+    # then entries whose title or text contain the search words, best first,
+    # from the database's full-text index when entries are kept in sqlite
+    full_text = util.search_entries(query, limit=None)
+    if full_text is None:
+        full_text = search_index.search(query, limit=None)
+    found = set(search_result)
+    for entry in full_text:
+        if entry not in found:
+            search_result.append(entry)
+            found.add(entry)
+
+    # titles that look like a misspelling of the query
+    suggestions = [entry for entry in trigram_index.similar(query)
+                   if entry not in found]
+    return search_result, suggestions
+
+# one page of the results of query, as (titles, next after, suggestions).
+# The full results are searched for once and kept in search_cache, so the
+# following pages are only sliced from them
+def search_page(query, after, limit):
+    cached = search_cache.get(query)
+    if cached is None:
+        cached = search_cache.put(query, *search_results(query))
+    titles, positions, suggestions = cached
+    page, next_after = page_of(titles, positions, after, limit)
+    return page, next_after, suggestions
+
+# the form in the layout posts the query; links to further pages of
+# results send it back as ?q=<query>&after=<last title shown>
 def search(request):
-    if request.method=="POST":
+    query = request.POST.get('q') if request.method=="POST" else request.GET.get('q')
+    if query is not None:
         # exact matches
         # form input name defined in layout page
-        query = request.POST['q']
-        if util.get_entry(query) is not None:
+        if util.entry_exists(query):
             # content = convert_md_to_html(query)
             # return render(request, "encyclopedia/entry.html",
             #     {"content": content})
@@ -52,16 +213,27 @@ def search(request):
     
         # partial matches
         else:
-            search_result = []
-            existing_entries  = util.list_entries()
-            # save results to a list
-            for entry in existing_entries:
-                if query.lower() in entry.lower():
-                    search_result.append(entry)
-            
+            search_result, next_after, suggestions = search_page(
+                query, request.GET.get('after'), PAGE_SIZE)
+
             # display on html
             return render(request, "encyclopedia/results.html",
-                {"search_result": search_result})
+                {"search_result": search_result, "suggestions": suggestions,
+                 "query": query, "next_after": next_after})
+    return redirect(reverse('index'))
+
+# titles starting with what has been typed in the search box so far, as json
+# completions only change when a page is created, so browsers may reuse them
+@require_GET
+@cache_control(public=True, max_age=60)
+def autocomplete(request):
+    query = request.GET.get('q', '')
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+    results = title_completer.complete(query, limit) if query else []
+    return JsonResponse({"query": query, "results": results})
 
 def create_page(request):
     if request.method=="GET":
@@ -73,7 +245,7 @@ def create_page(request):
         page_content = request.POST['page_content']
 
         # check if page exists
-        if util.get_entry(title) is not None:
+        if util.entry_exists(title):
         # if yes go to error page
             return render(request, "encyclopedia/error.html",
                 {"message": "page already exist"})
@@ -97,6 +269,8 @@ def edit(request, title):
     else:
         # does not retreive title value, because title was not suppose to change
         new_content = request.POST['page_content']
+        # saving also drops the old html from render_cache and queues the
+        # page to be rendered again in the background
         util.save_entry(title, new_content)
         # return entry page
         # Construct the URL with the title parameter
@@ -104,7 +278,16 @@ def edit(request, title):
         return redirect(url)
 
 def rand(request):
-    allEntries = util.list_entries()
-    rand_entry = random.choice(allEntries)
+    # picked straight from the title index, without listing every entry
+    rand_entry = util.random_entry()
+    if rand_entry is None:
+        return render(request, "encyclopedia/error.html",
+            {"message": "there are no pages yet"})
     url = reverse('entry', args=[rand_entry])
     return redirect(url)
+
+# hit / miss counters of the rendered html cache and of the block cache
+def render_cache_stats(request):
+    stats = render_cache.stats()
+    stats["blocks"] = block_renderer.cache.stats()
+    return JsonResponse(stats)
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import util
+
+try:
+    # uses inotify on linux; without it the folder is polled
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def title_of(path):
+    """
+    Returns the entry title a file path belongs to, or None for files
+    that are not entries, such as history and temporary files.
+    """
+    name = os.path.basename(path)
+    if name.startswith(".") or f"{os.sep}.history{os.sep}" in path:
+        return None
+    for suffix in (".md", ".mdz"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+def _refresh(title):
+    try:
+        util.refresh_entry(title)
+    except Exception:
+        logger.exception("could not refresh entry %r", title)
+
+
+class PollingWatcher(threading.Thread):
+    """
+    Compares the modification times and sizes of the files under the
+    entries folder every few seconds and refreshes entries that changed.
+    """
+
+    def __init__(self, root, interval):
+        super().__init__(name="entry-watcher", daemon=True)
+        self.root = root
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def _snapshot(self):
+        files = {}
+        for folder, subfolders, filenames in os.walk(self.root):
+            # skip .history, .dictionaries and any other hidden folders
+            subfolders[:] = [name for name in subfolders if not name.startswith(".")]
+            for name in filenames:
+                path = os.path.join(folder, name)
+                title = title_of(path)
+                if title is None:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[title] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def run(self):
+        previous = self._snapshot()
+        while not self._stopped.wait(self.interval):
+            current = self._snapshot()
+            for title in previous.keys() | current.keys():
+                if previous.get(title) != current.get(title):
+                    _refresh(title)
+            previous = current
+
+    def stop(self):
+        self._stopped.set()
+
+
+if Observer is not None:
+    class _EntryEventHandler(FileSystemEventHandler):
+        # only changes to files count: inotify also reports opening and
+        # closing a file, and refresh_entry reading the file would then
+        # trigger another refresh, forever
+        def _changed(self, event, *paths):
+            if event.is_directory:
+                return
+            for path in paths:
+                title = title_of(path)
+                if title is not None:
+                    _refresh(title)
+
+        def on_created(self, event):
+            self._changed(event, event.src_path)
+
+        def on_modified(self, event):
+            self._changed(event, event.src_path)
+
+        def on_deleted(self, event):
+            self._changed(event, event.src_path)
+
+        # a rename reports both the old and the new name
+        def on_moved(self, event):
+            self._changed(event, event.src_path, event.dest_path)
+
+
+def start_watcher(root=None):
+    """
+    Starts watching the entries folder in a background thread, with
+    inotify through watchdog when it is installed and by polling every
+    WIKI_WATCH_INTERVAL seconds otherwise. Returns the watcher, which
+    has a stop() method.
+    """
+    root = root or default_storage.path("entries")
+    if Observer is not None:
+        watcher = Observer()
+        watcher.schedule(_EntryEventHandler(), root, recursive=True)
+        watcher.daemon = True
+    else:
+        watcher = PollingWatcher(root, getattr(settings, "WIKI_WATCH_INTERVAL", 2))
+    watcher.start()
+    return watcher
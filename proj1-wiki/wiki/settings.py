@@ -119,3 +119,46 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Encyclopedia
+
+# number of titles shown per page of the index and of search results
+WIKI_PAGE_SIZE = 200
+
+# upper bound on the size of rendered entry HTML kept in memory
+WIKI_RENDER_CACHE_BYTES = 32 * 1024 * 1024
+
+# upper bound on the number of titles kept from recent searches, so that
+# further pages of results don't search again
+WIKI_SEARCH_CACHE_TITLES = 100000
+
+# threads rendering entries into the render cache right after they are
+# saved; 0 leaves rendering to the first reader
+WIKI_PRERENDER_WORKERS = 2
+
+# entries at least this big are rendered block by block, and the html of
+# each block is cached, up to this many bytes, for the next edit
+WIKI_INCREMENTAL_RENDER_BYTES = 64 * 1024
+WIKI_BLOCK_CACHE_BYTES = 32 * 1024 * 1024
+
+# how entries are stored: "default" keeps one file per entry in the
+# entries folder, "atomic" replaces files with a rename and keeps a
+# compressed edit history in entries/.history, "sharded" does the same
+# but spreads entries over hashed subfolders (see reshard_entries),
+# "compressed" and "sharded-compressed" are "atomic" and "sharded" with
+# entries compressed against a shared dictionary (see compress_entries),
+# "sqlite" keeps them in the database with a full-text index (see
+# import_entries_to_db)
+WIKI_ENTRY_STORAGE = "default"
+
+# watch the entries folder for files changed outside the wiki (git pull,
+# rsync) and update the in-memory indexes; uses inotify if the watchdog
+# package is installed, otherwise checks every WIKI_WATCH_INTERVAL seconds
+WIKI_WATCH_ENTRIES = False
+WIKI_WATCH_INTERVAL = 2
+
+# serve the index, entry and search pages with the async views in
+# encyclopedia/async_views.py; only useful when running under asgi
+WIKI_ASYNC_VIEWS = False
+WIKI_ASYNC_IO_WORKERS = 32
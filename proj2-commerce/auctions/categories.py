@@ -0,0 +1,47 @@
+import threading
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category
+
+
+# categories rarely change, so they are read from the database once per
+# process and kept until a Category is saved or deleted in this process
+# (another worker process keeps its own copy until it restarts or saves one)
+_categories = None
+_lock = threading.Lock()
+
+
+def _load():
+    global _categories
+    with _lock:
+        if _categories is None:
+            _categories = {category.id: category for category in Category.objects.order_by('id')}
+        return _categories
+
+
+def all_categories():
+    """
+    Returns every category, in the order they were created.
+    """
+    return list(_load().values())
+
+
+def get_category(category_id):
+    """
+    Returns the category with this id, or None if the id is not a
+    known category (or not a number at all).
+    """
+    try:
+        return _load().get(int(category_id))
+    except (TypeError, ValueError):
+        return None
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate(**kwargs):
+    global _categories
+    with _lock:
+        _categories = None
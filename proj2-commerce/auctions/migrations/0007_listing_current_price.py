@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+# fill in the new fields from the bids placed before they existed
+def copy_last_bids(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    for listing in Listing.objects.all():
+        bids = Bid.objects.filter(listing=listing).order_by('id')
+        last_bid = bids.last()
+        listing.current_price = last_bid.price if last_bid else None
+        listing.bid_count = bids.count()
+        listing.save(update_fields=['current_price', 'bid_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_comments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='current_price',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_last_bids, migrations.RunPython.noop),
+    ]
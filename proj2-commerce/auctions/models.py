@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 
 
 # USE CAPITALISE FOR FIRST LETTER IN NAME
@@ -24,6 +25,19 @@ class Listing(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='userlist')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True, related_name='category') 
     watchlist = models.ManyToManyField(User, blank=True, null=True, related_name="listingwatchlist")
+    # copied from the latest Bid every time one is placed, so pages listing
+    # many items can show prices without a query per listing
+    current_price = models.FloatField(blank=True, null=True)
+    bid_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # active listings, optionally of one category (index, displayCategory);
+            # partial, because sqlite filters booleans as a bare "WHERE active_status"
+            # which a plain index on active_status can't be used for
+            models.Index(fields=['category', 'id'], condition=Q(active_status=True),
+                         name='listing_active_category_idx'),
+        ]
 
     # display item name in admin panel
     def __str__(self):
@@ -33,9 +47,43 @@ class Listing(models.Model):
 class Bid(models.Model):
     bidder = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='bidder_name')
     price = models.FloatField()
-    listing = models.ForeignKey(Listing,on_delete=models.CASCADE, related_name='auction_item')
+    # indexed by bid_listing_date_idx below, which starts with listing
+    listing = models.ForeignKey(Listing,on_delete=models.CASCADE, related_name='auction_item', db_index=False)
     date_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # latest bid of a listing (listing page)
+            models.Index(fields=['listing', 'date_time'], name='bid_listing_date_idx'),
+        ]
+
+    # a new bid becomes the current price of its listing, in the same transaction
+    # (place() has already updated the listing, so it passes update_listing=False)
+    def save(self, *args, update_listing=True, **kwargs):
+        if self.pk is not None or not update_listing:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Listing.objects.filter(pk=self.listing_id).update(
+                current_price=self.price, bid_count=F('bid_count') + 1)
+
+    # records a bid only if the listing is active and the bid beats its current
+    # price. The check and the price change are one UPDATE, so of two bidders
+    # racing the lower one can never land last. Returns the new Bid, or None
+    # if the bid was rejected.
+    @classmethod
+    def place(cls, listing_id, bidder, price):
+        beats_current = Q(current_price__lt=price) | Q(current_price__isnull=True, start_bid__lte=price)
+        with transaction.atomic():
+            accepted = (Listing.objects
+                .filter(beats_current, pk=listing_id, active_status=True)
+                .update(current_price=price, bid_count=F('bid_count') + 1))
+            if not accepted:
+                return None
+            bid = cls(bidder=bidder, price=price, listing_id=listing_id)
+            bid.save(update_listing=False)
+            return bid
+
     # display item name in admin panel
     def __str__(self):
         return f'{self.listing.title} {self.price}'
@@ -44,9 +92,16 @@ class Bid(models.Model):
 class Comments(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='author_name')
     comment = models.CharField(max_length=500)
-    listing = models.ForeignKey(Listing,on_delete=models.CASCADE)
+    # indexed by comments_listing_date_idx below, which starts with listing
+    listing = models.ForeignKey(Listing,on_delete=models.CASCADE, db_index=False)
     date_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # comments of a listing in the order they were written
+            models.Index(fields=['listing', 'date_time'], name='comments_listing_date_idx'),
+        ]
+
     # display item name in admin panel
     def __str__(self):
         return f'{self.author} {self.listing.title}'
\ No newline at end of file
@@ -0,0 +1,65 @@
+// infinite scroll for the index, category and watchlist pages: when the
+// "Next page" link comes into view, fetch that page as json and add its cards
+document.addEventListener('DOMContentLoaded', () => {
+    const link = document.querySelector('#next-page');
+    const listings = document.querySelector('#listings');
+    if (!link || !listings || !('IntersectionObserver' in window)) {
+        return;
+    }
+    let nextUrl = link.dataset.jsonUrl;
+    let loading = false;
+
+    // same markup as the cards in index.html
+    const card = (listing) => {
+        const col = document.createElement('div');
+        col.className = 'col';
+        col.innerHTML = `
+            <div class="card">
+                <img class="card-img-top" height="214px">
+                <div class="card-body">
+                    <h5 class="card-title"></h5>
+                    <span class="price"></span>
+                    <p class="card-text"></p>
+                    <a class="btn btn-primary">Details</a>
+                </div>
+            </div>`;
+        // textContent and attributes, so listing text is never parsed as html
+        const img = col.querySelector('img');
+        img.src = listing.image_url;
+        img.alt = listing.title;
+        col.querySelector('.card-title').textContent = listing.title;
+        col.querySelector('.price').textContent = `Current Price: $${listing.current_price}`;
+        col.querySelector('.card-text').textContent = `Description: ${listing.description}`;
+        col.querySelector('a').href = listing.url;
+        return col;
+    };
+
+    const observer = new IntersectionObserver(entries => {
+        if (loading || !nextUrl || !entries.some(entry => entry.isIntersecting)) {
+            return;
+        }
+        loading = true;
+        fetch(nextUrl)
+            .then(response => response.json())
+            .then(page => {
+                page.listings.forEach(listing => listings.append(card(listing)));
+                nextUrl = page.next;
+                if (!nextUrl) {
+                    observer.disconnect();
+                    link.remove();
+                    return;
+                }
+                // keep the plain link pointing after the last card shown
+                const url = new URL(nextUrl, window.location);
+                url.searchParams.delete('format');
+                link.href = url;
+                // observe again, so a link still in view loads the next page too
+                observer.unobserve(link);
+                observer.observe(link);
+            })
+            // the link still works as a plain next page link
+            .catch(() => observer.disconnect())
+            .finally(() => { loading = false; });
+    });
+    observer.observe(link);
+});
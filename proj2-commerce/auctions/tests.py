@@ -1,3 +1,288 @@
-from django.test import TestCase
+import re
+import unittest
+from unittest import mock
+
+from django.db import connection, reset_queries
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import *
+from . import categories, views
 
 # Create your tests here.
+
+# tables that grow with use; reading them must always go through an index
+BIG_TABLES = {'auctions_listing', 'auctions_bid', 'auctions_comments'}
+
+# a SQLite plan step that reads a whole table without an index
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every query the busiest pages make and
+    fails if any of them scans a whole listing, bid or comment table.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor != 'sqlite' or not connection.features.supports_explaining_query_execution:
+            raise unittest.SkipTest('query plans are checked on SQLite')
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        cls.pizza = Category.objects.create(categoryName='Pizza')
+        cls.rice = Category.objects.create(categoryName='Rice')
+        for i in range(20):
+            listing = Listing.objects.create(
+                title=f'Item {i}', description='food', start_bid=10, image_url='',
+                category=cls.pizza if i % 2 else cls.rice, owner=cls.seller,
+                active_status=i % 3 != 0)
+            Bid.objects.create(bidder=cls.seller, price=10, listing=listing)
+            Bid.objects.create(bidder=cls.bidder, price=12, listing=listing)
+            Comments.objects.create(author=cls.bidder, comment='tasty', listing=listing)
+            listing.watchlist.add(cls.bidder)
+        cls.listing = Listing.objects.filter(active_status=True).first()
+
+    def setUp(self):
+        self.client.force_login(self.bidder)
+
+    # the plan steps of every SELECT a request makes, as (step, sql) pairs
+    def plans(self, method, url, data=None):
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400)
+
+        steps = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                steps.extend((row[-1], sql) for row in cursor.fetchall())
+        return steps
+
+    def full_scans(self, method, url, data=None):
+        scans = []
+        for step, sql in self.plans(method, url, data):
+            match = FULL_SCAN.match(step)
+            if match and match.group(1) in BIG_TABLES:
+                scans.append(f'{step}: {sql}')
+        return scans
+
+    def test_index(self):
+        self.assertEqual(self.full_scans('get', reverse('index')), [])
+
+    def test_display_category(self):
+        self.assertEqual(self.full_scans('post', reverse('displayCategory'), {'category': self.pizza.id}), [])
+
+    def test_watchlist(self):
+        self.assertEqual(self.full_scans('get', reverse('watchlist')), [])
+        self.assertEqual(self.full_scans('post', reverse('watchlist'), {'category': self.rice.id}), [])
+
+    def test_listing(self):
+        url = reverse('listing', args=(self.listing.id, ))
+        self.assertEqual(self.full_scans('get', url), [])
+        # the latest bid and the comments are read along their composite indexes
+        steps = ' '.join(step for step, sql in self.plans('get', url))
+        self.assertIn('bid_listing_date_idx', steps)
+        self.assertIn('comments_listing_date_idx', steps)
+        self.assertNotIn('TEMP B-TREE', steps)
+
+    def test_new_bid(self):
+        url = reverse('new_bid', args=(self.listing.id, ))
+        self.assertEqual(self.full_scans('post', url, {'bid_price': '50'}), [])
+        # a rejected bid renders the listing page
+        self.assertEqual(self.full_scans('post', url, {'bid_price': '1'}), [])
+
+
+class CategoryCacheTests(TestCase):
+
+    def setUp(self):
+        categories.invalidate()
+        self.pizza = Category.objects.create(categoryName='Pizza')
+
+    def test_cached_until_changed(self):
+        self.assertEqual(categories.all_categories(), [self.pizza])
+        with self.assertNumQueries(0):
+            categories.all_categories()
+            self.assertEqual(categories.get_category(str(self.pizza.id)), self.pizza)
+
+        rice = Category.objects.create(categoryName='Rice')
+        self.assertEqual(categories.all_categories(), [self.pizza, rice])
+        rice.delete()
+        self.assertEqual(categories.all_categories(), [self.pizza])
+
+    def test_unknown_id(self):
+        self.assertIsNone(categories.get_category('Pizza'))
+        self.assertIsNone(categories.get_category(self.pizza.id + 1))
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+        cls.pizza = Category.objects.create(categoryName='Pizza')
+        for i in range(7):
+            Listing.objects.create(title=f'Item {i}', description='food', start_bid=10, image_url='',
+                                   category=cls.pizza, owner=cls.user)
+
+    def test_pages_cover_every_listing_once(self):
+        listings = Listing.objects.filter(active_status=True)
+        ids, after = [], None
+        while True:
+            page, after = views.page_of(listings, after, 3)
+            ids += [listing.id for listing in page]
+            if after is None:
+                break
+        self.assertEqual(ids, list(listings.order_by('id').values_list('id', flat=True)))
+
+    def test_json_next_link_keeps_category(self):
+        url = f"{reverse('displayCategory')}?category={self.pizza.id}&format=json"
+        ids = []
+        with mock.patch.object(views, 'PAGE_SIZE', 3):
+            while url:
+                page = self.client.get(url).json()
+                ids += [listing['id'] for listing in page['listings']]
+                url = page['next']
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(ids, sorted(ids))
+
+
+class BidTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        cls.listing = Listing.objects.create(title='Pizza', description='food', start_bid=10,
+                                             image_url='', owner=cls.seller)
+        Bid.objects.create(bidder=cls.seller, price=10, listing=cls.listing)
+
+    def setUp(self):
+        self.client.force_login(self.bidder)
+        self.url = reverse('new_bid', args=(self.listing.id, ))
+
+    def test_higher_bid_is_accepted(self):
+        response = self.client.post(self.url, {'bid_price': '12.5'})
+        self.assertRedirects(response, reverse('listing', args=(self.listing.id, )))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, 12.5)
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(Bid.objects.filter(listing=self.listing).last().bidder, self.bidder)
+
+    def test_equal_or_lower_bid_is_rejected(self):
+        for price in ('10', '9'):
+            with self.subTest(price=price):
+                response = self.client.post(self.url, {'bid_price': price})
+                self.assertContains(response, "Bid price must be higher than last bid price")
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.current_price, self.listing.bid_count), (10, 1))
+        self.assertEqual(Bid.objects.filter(listing=self.listing).count(), 1)
+
+    def test_closed_listing_is_rejected(self):
+        Listing.objects.filter(pk=self.listing.pk).update(active_status=False)
+        response = self.client.post(self.url, {'bid_price': '50'})
+        self.assertContains(response, "This auction is closed")
+        self.assertEqual(Bid.objects.filter(listing=self.listing).count(), 1)
+
+    def test_first_bid_is_compared_with_start_bid(self):
+        listing = Listing.objects.create(title='Rice', description='food', start_bid=10,
+                                         image_url='', owner=self.seller)
+        self.assertIsNone(listing.current_price)
+        self.assertIsNone(Bid.place(listing.id, self.bidder, 9))
+        self.assertIsNotNone(Bid.place(listing.id, self.bidder, 10))
+        listing.refresh_from_db()
+        self.assertEqual((listing.current_price, listing.bid_count), (10, 1))
+
+    def test_missing_or_bad_price_shows_a_message(self):
+        for price in ('', 'abc'):
+            with self.subTest(price=price):
+                response = self.client.post(self.url, {'bid_price': price})
+                self.assertContains(response, "Please enter a bid price")
+        self.assertEqual(Bid.objects.filter(listing=self.listing).count(), 1)
+
+
+class CurrentPriceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.pizza = Category.objects.create(categoryName='Pizza')
+
+    def create_listings(self, count):
+        for i in range(count):
+            listing = Listing.objects.create(title=f'Item {i}', description='food', start_bid=10,
+                                             image_url='', category=self.pizza, owner=self.seller)
+            Bid.objects.create(bidder=self.seller, price=10, listing=listing)
+            Bid.objects.create(bidder=self.seller, price=15, listing=listing)
+
+    def test_new_bid_updates_listing(self):
+        self.create_listings(1)
+        listing = Listing.objects.get()
+        self.assertEqual((listing.current_price, listing.bid_count), (15, 2))
+
+        # saving an existing bid again does not count it twice
+        bid = Bid.objects.last()
+        bid.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.bid_count, 2)
+
+    def test_index_queries_do_not_grow_with_listings(self):
+        # categories are cached; load them so both counts exclude them
+        categories.all_categories()
+        for count in (2, 20):
+            self.create_listings(count)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('index'))
+            self.assertContains(response, '$15.0')
+
+
+class CopyLastBidsMigrationTests(TransactionTestCase):
+    """
+    Migration 0007 fills in current_price and bid_count of listings that
+    had bids before the fields existed.
+    """
+
+    before = [('auctions', '0006_comments')]
+    after = [('auctions', '0007_listing_current_price')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        Listing = apps.get_model('auctions', 'Listing')
+        Bid = apps.get_model('auctions', 'Bid')
+
+        self.with_bids = Listing.objects.create(title='Pizza', description='food', start_bid=10,
+                                                image_url='')
+        for price in (10, 12, 11.5):
+            Bid.objects.create(price=price, listing=self.with_bids)
+        self.without_bids = Listing.objects.create(title='Rice', description='food', start_bid=5,
+                                                   image_url='')
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        self.apps = executor.loader.project_state(self.after).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes('auctions'))
+
+    def test_backfill(self):
+        Listing = self.apps.get_model('auctions', 'Listing')
+        # the last bid placed, not the highest
+        self.assertEqual(Listing.objects.filter(pk=self.with_bids.pk)
+                         .values_list('current_price', 'bid_count').get(), (11.5, 3))
+        self.assertEqual(Listing.objects.filter(pk=self.without_bids.pk)
+                         .values_list('current_price', 'bid_count').get(), (None, 0))
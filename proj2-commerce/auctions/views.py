@@ -1,90 +1,116 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
 from .models import *
+from .categories import all_categories, get_category
 
-# default route to view all active listings
-def index(request):
+# how many listings the index, category and watchlist pages show at a time
+PAGE_SIZE = getattr(settings, "AUCTIONS_PAGE_SIZE", 30)
+
+
+# one page of listings with an id above after, in id order, plus the id to continue
+# from (None on the last page). Filtering on the id instead of using an offset means
+# a page only reads its own rows, however far into the list it is
+def page_of(listings, after, limit):
     try:
-        # retreive all active items listed from [Listing] table
-        active_listing = Listing.objects.filter(active_status=True)
-        # retrieve all categories defined in table
-        food_category = Category.objects.all()
+        after = int(after or 0)
+    except ValueError:
+        after = 0
+    # one extra row tells whether there is a next page
+    page = list(listings.filter(id__gt=after).order_by('id')[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], page[limit - 1].id
+    return page, None
+
+
+# link to the page after next_after, keeping the selected category
+def next_page_url(route, next_after, category=None, as_json=False):
+    if next_after is None:
+        return None
+    params = {"after": next_after}
+    if category is not None:
+        params["category"] = category
+    if as_json:
+        params["format"] = "json"
+    return f"{reverse(route)}?{urlencode(params)}"
+
+
+# render a page of listings, or with ?format=json return it for the infinite scroll
+def render_listings(request, template, route, listings, category=None):
+    selected_listings, next_after = page_of(listings, request.GET.get('after'), PAGE_SIZE)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            "listings": [{
+                "id": listing.id,
+                "title": listing.title,
+                "description": listing.description,
+                "image_url": listing.image_url,
+                "current_price": listing.current_price,
+                "url": reverse("listing", args=(listing.id, )),
+            } for listing in selected_listings],
+            "next": next_page_url(route, next_after, category, as_json=True),
+        })
+
+    # categories are cached, see categories.py
+    return render(request, template,
+        {"active_listing": selected_listings,
+         'food_category': all_categories(),
+         'next_page': next_page_url(route, next_after, category),
+         'next_page_json': next_page_url(route, next_after, category, as_json=True),
+         })
 
-        # how to display last price of all active listings?
-        last_bid_dict = {}
 
-        for listing in active_listing:
-            # retreive all bids history for 1 listing
-            all_bids = Bid.objects.filter(listing=listing)
-            last_bid = all_bids.last()
-            last_bid_dict[listing.id]=last_bid.price
+# listings of the category id submitted on a form, or all of them for "All Categories"
+def in_category(listings, category_from_form):
+    if category_from_form in (None, "All Categories"):
+        return listings
+    # look the id up in the cached categories instead of matching the name in the table
+    selected_category = get_category(category_from_form)
+    if selected_category is None:
+        return listings.none()
+    # category in Listing is defined as a Foreign key, so filter on its id directly
+    return listings.filter(active_status=True, category_id=selected_category.id)
 
-    except Listing.DoesNotExist:
-        active_listing = None
 
-    print(last_bid.price)
-    return render(request, "auctions/index.html",
-        {"active_listing": active_listing,
-         'food_category': food_category,
-         'all_last_bids': last_bid_dict
+# default route to view all active listings
+def index(request):
+    # retreive all active items listed from [Listing] table, a page at a time
+    # each listing carries its current price, so there is no query per listing
+    active_listing = Listing.objects.filter(active_status=True)
 
-         })
+    return render_listings(request, "auctions/index.html", "index", active_listing)
 
 # handles the drop down category filter to render index page with selected category
 def displayCategory(request):
-    if request.method == "POST":
-        # retrieve all categories defined in table
-        food_category = Category.objects.all()
+    # the form posts the category id; the next page links carry it in the url
+    params = request.POST if request.method == "POST" else request.GET
+    category_from_form = params.get('category', "All Categories")
 
-        # get category submitted on form
-        category_from_form = request.POST['category']
-
-        # if all is selected
-        if category_from_form == "All Categories":
-            selected_listings = Listing.objects.filter(active_status=True)
-        
-        # if one category is selected
-        else:
-            # use submitted string to find category class in table
-            selected_category = Category.objects.get(categoryName = category_from_form)
-            # category in Listing is defined as a Foreign key
-            selected_listings = Listing.objects.filter(active_status=True, category=selected_category)
+    selected_listings = in_category(Listing.objects.filter(active_status=True), category_from_form)
 
-        return render(request, "auctions/index.html",
-            {"active_listing": selected_listings,
-            'food_category': food_category})
+    return render_listings(request, "auctions/index.html", "displayCategory", selected_listings,
+        category_from_form)
 
 # replcia of displayCategory, but renders for watchlist page instead of index
 def watchlist(request):
-    food_category = Category.objects.all()
     current_user = request.user
+    # listingwatchlist is a related name of watchlist in Listing()
     watchlist_listings = current_user.listingwatchlist.all()
-    
-    if request.method == "GET":
-        # listingwatchlist is a related name of watchlist in Listing()
-        return render(request, "auctions/watchlist.html",
-            {"active_listing": watchlist_listings,
-            'food_category': food_category})
-    else: 
-        # get category submitted on form
-        category_from_form = request.POST['category']
-
-        # if all is selected
-        if category_from_form == "All Categories":
-            selected_listings = watchlist_listings
-        
-        # if one category is selected
-        else:
-            selected_category = Category.objects.get(categoryName = category_from_form)
-            # category in Listing is defined as a Foreign key
-            selected_listings = watchlist_listings.filter(active_status=True, category=selected_category)
 
-        return render(request, "auctions/watchlist.html",
-            {"active_listing": selected_listings,
-            'food_category': food_category})
+    # get category submitted on form (the category id), or kept in the next page link
+    params = request.POST if request.method == "POST" else request.GET
+    category_from_form = params.get('category')
+
+    selected_listings = in_category(watchlist_listings, category_from_form)
+
+    return render_listings(request, "auctions/watchlist.html", "watchlist", selected_listings,
+        category_from_form)
 
 
 # display individual listing details, including last bid price
@@ -93,12 +119,11 @@ def listing(request, post_id, message=None):
     # if current user is in the list of User stored in the listingdata.watchlist column
     is_watchlist = request.user in listingdata.watchlist.all()
     # get all bids related to a specific listing
-    all_bids = Bid.objects.filter(listing=listingdata)
-    # isolating the last bid. first() was introduced in notes
-    last_bid = all_bids.last()
+    # the latest bid, read backwards along the (listing, date_time) index
+    last_bid = Bid.objects.filter(listing=listingdata).order_by('-date_time', '-id').first()
 
-    # getting all comments
-    all_commments = Comments.objects.filter(listing=listingdata)
+    # getting all comments, oldest first along the (listing, date_time) index
+    all_commments = Comments.objects.filter(listing=listingdata).order_by('date_time', 'id')
 
     return render(request, "auctions/listing.html",
         {"listing": listingdata,
@@ -126,41 +151,32 @@ def comment(request, post_id):
 
 # user can bid for items
 def new_bid(request, post_id):
-    listingdata = Listing.objects.get(pk=post_id)
-    all_bids = Bid.objects.filter(listing=listingdata)
-
-    # using last() function to retreive data from many to many relattionships
-    last_bid = all_bids.last().price
-
     # retrieve bid submission from form
-    bid_from_form = float(request.POST['bid_price'])
+    try:
+        bid_from_form = float(request.POST['bid_price'])
+    except ValueError:
+        bid_from_form = None
 
-    # check if bid submission is bigger than last bid
-    if bid_from_form > last_bid:
-        bid_new_row = Bid(
-            bidder = request.user,
-            price = bid_from_form,
-            listing = listingdata
-        )
-        # list_new_row.id to get unique id
-        bid_new_row.save()
+    # compare with the current price and save the bid in one step,
+    # so that another bid arriving at the same time can't slip in between
+    if bid_from_form is not None and Bid.place(post_id, request.user, bid_from_form):
         return HttpResponseRedirect(reverse("listing", args=(post_id, )))
 
     else:
+        listingdata = Listing.objects.get(pk=post_id)
         # if bid is lower, present an error
-        message = "Bid price must be higher than last bid price"
-        # render error page
-        # return render(request, "auctions/error.html",
-        #     {"message": message
-        #     })
+        if bid_from_form is None:
+            message = "Please enter a bid price"
+        elif not listingdata.active_status:
+            message = "This auction is closed"
+        else:
+            message = "Bid price must be higher than last bid price"
 
-        listingdata = Listing.objects.get(pk=post_id)
         # if current user is in the list of User stored in the listingdata.watchlist column
         is_watchlist = request.user in listingdata.watchlist.all()
         # get all bids related to a specific listing
-        all_bids = Bid.objects.filter(listing=listingdata)
-        # isolating the last bid. first() was introduced in notes
-        last_bid = all_bids.last()
+        # the latest bid, read backwards along the (listing, date_time) index
+        last_bid = Bid.objects.filter(listing=listingdata).order_by('-date_time', '-id').first()
 
         return render(request, "auctions/listing.html",
             {"listing": listingdata,
@@ -197,10 +213,8 @@ def removeWatchlist(request, post_id):
 
 def create(request):
     if request.method == "GET":
-        current_user = request.user
-        print(current_user)
         # displays as object on webpage, not the category name
-        food_category = Category.objects.all()
+        food_category = all_categories()
         return render(request, "auctions/create.html", 
             {'food_category': food_category})
     else:
@@ -208,9 +222,13 @@ def create(request):
         description = request.POST['description']
         start_bid = request.POST['start_bid']
         image_url = request.POST['image_url']
-        # category = request.POST['category'] will be just a string 
-        # now category is a row object here
-        category = Category.objects.get(categoryName = request.POST['category'])
+        # category = request.POST['category'] will be just the id as a string
+        # now category is a row object here, taken from the cached list
+        category = get_category(request.POST['category'])
+        if category is None:
+            return render(request, "auctions/create.html",
+                {'food_category': all_categories(),
+                 'message': "Please select a category"})
         list_new_row = Listing(
             title = title,
             description = description,
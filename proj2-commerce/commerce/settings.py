@@ -120,3 +120,10 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Auctions
+
+# number of listings shown per page of the index, category and watchlist
+# pages, and per request of the infinite scroll
+AUCTIONS_PAGE_SIZE = 30